@@ -0,0 +1,462 @@
+# This file is part of the vis-orbitN distribution (https://github.com/japhir/vis-orbitN).
+# Copyright (c) 2023 Ilja J. Kocken
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Benchmark every stage of visualise_orbitN.py on synthetic orbitN output.
+
+    python benchmark_orbitN.py --sizes 1e4 1e5 1e6 --output bench.json
+    blender -b --python benchmark_orbitN.py -- --sizes 1e4 1e5 1e6 --output bench.json
+
+The data stages run in any python with numpy and pyorb, the Blender stages
+only under Blender and are reported as skipped otherwise. Once a stage takes
+longer than --budget seconds, or would at the next size going by how long it
+took at the last one, it is skipped for the larger sizes. A stage that fails
+(e.g. runs out of memory) is recorded as failed and not tried again. The
+results are written to --output after every stage. Pass --compare old.json
+to fail (exit status 1) when a stage got more than --tolerance times slower.
+
+benchmark_make_mesh and benchmark_element_curves check single builders in
+more detail, from Blender's python console:
+
+    import benchmark_orbitN
+    benchmark_orbitN.benchmark_make_mesh(nrows = 10**6)
+
+Use write_experiment to only generate fake output, e.g. to try the builders
+without running orbitN:
+
+    python benchmark_orbitN.py --generate /tmp/sim/synthetic --rows 100000
+"""
+
+import argparse
+import datetime
+import json
+import math
+import os
+import platform
+import sys
+import tempfile
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+import visualise_orbitN as vo
+from orbitN_batch import script_args
+
+#######################################################################
+#                     synthetic orbitN output                         #
+#######################################################################
+
+# roughly the J2000 elements of the planets and Pluto: name, mass (Msol),
+# a (AU), e, i, omega, Omega, mean anomaly (degrees), and a made-up period
+# (kyr) for the precession of omega and Omega and the cycles in e and i
+bodies = [
+    ("Mercury", 1.6601e-7, 0.387098, 0.205630, 7.005, 29.124, 48.331, 174.796, 250),
+    ("Venus", 2.4478e-6, 0.723332, 0.006772, 3.39458, 54.884, 76.680, 50.115, 280),
+    ("Earth", 3.0035e-6, 1.000003, 0.016709, 0.00005, 114.20783, -11.26064, 358.617, 405),
+    ("Mars", 3.2272e-7, 1.523710, 0.093394, 1.850, 286.502, 49.558, 19.412, 95),
+    ("Jupiter", 9.5479e-4, 5.2026, 0.048498, 1.303, 273.867, 100.464, 20.020, 300),
+    ("Saturn", 2.8588e-4, 9.5549, 0.055546, 2.485, 339.392, 113.665, 317.020, 45),
+    ("Uranus", 4.3662e-5, 19.2184, 0.046381, 0.773, 96.998857, 74.006, 142.2386, 430),
+    ("Neptune", 5.1514e-5, 30.110387, 0.009456, 1.770, 273.187, 131.784, 256.228, 1900),
+    ("Pluto", 7.396e-9, 39.482, 0.2488, 17.16, 113.834, 110.299, 14.53, 3800),
+]
+
+def synthetic_elements(body, t):
+    """
+    Slowly varying keplerian elements (t a e i omega Omega varpi anom, in AU
+    and radians) of one of the bodies at times t (days)
+    """
+    name, mass, a, e, i, omega, Omega, M0, period = body
+    phase = t / (period * 365.25e3) * math.tau
+    elements = np.empty((len(t), 8))
+    elements[:, 0] = t
+    elements[:, 1] = a
+    elements[:, 2] = e * (1 + 0.3 * np.sin(phase))
+    elements[:, 3] = np.radians(i) * (1 + 0.2 * np.cos(phase)) + 1e-5
+    elements[:, 4] = np.mod(np.radians(omega) + phase, math.tau)
+    elements[:, 5] = np.mod(np.radians(Omega) - phase / 2, math.tau)
+    elements[:, 6] = np.mod(elements[:, 4] + elements[:, 5], math.tau)
+    n = math.sqrt(vo.planet_mu(mass) / a**3)
+    elements[:, 7] = np.mod(np.radians(M0) + n * t, math.tau)
+    return(elements)
+
+def elements_to_cartesian(elements, mass):
+    """
+    Positions and velocities (t x y z vx vy vz, in AU and AU/d) for rows of
+    synthetic_elements
+    """
+    data = np.empty((len(elements), 7))
+    data[:, 0] = elements[:, 0]
+    data[:, 1:4], data[:, 4:7] = vo.orbit_cartesian(elements, mu = vo.planet_mu(mass))
+    return(data)
+
+def write_rows(filename, rows_of, nrows, chunk_rows = 2**16):
+    """
+    Write rows_of(start, stop) for all rows to a text file, one chunk at a time
+    """
+    with open(filename, 'w') as f:
+        for start in range(0, nrows, chunk_rows):
+            np.savetxt(f, rows_of(start, min(nrows, start + chunk_rows)), fmt = "%.16e")
+
+def write_experiment(directory, nrows, step = -400 * 365.25, bodies_to_write = range(0, 10)):
+    """
+    Write fake orbitN output for the Sun, the planets and Pluto: an
+    orbitN-coord.inp that get_inp can read, and for each of bodies_to_write
+    nrows rows of cartesian (.dat) and keplerian (.elm.dat) output with a
+    timestep of step days
+    """
+    os.makedirs(directory, exist_ok = True)
+    with open(os.path.join(directory, "orbitN-coord.inp"), 'w') as f:
+        for body in bodies:
+            data = elements_to_cartesian(synthetic_elements(body, np.zeros(1)), body[1])[0]
+            f.write(f"# {body[0]}\n{body[1]:.16e}\n")
+            f.write(" ".join(f"{x:.16e}" for x in data[1:4]) + " \\\n")
+            f.write(" ".join(f"{x:.16e}" for x in data[4:7]) + "\n")
+    for j in bodies_to_write:
+        base = os.path.join(directory, f"orbitN-{j}")
+        if j == 0:
+            # the sun stays put in heliocentric coordinates
+            write_rows(base + ".dat", lambda start, stop: np.column_stack(
+                [np.arange(start, stop) * step, np.zeros((stop - start, 6))]), nrows)
+            write_rows(base + ".elm.dat", lambda start, stop: np.column_stack(
+                [np.arange(start, stop) * step, np.zeros((stop - start, 7))]), nrows)
+            continue
+        body = bodies[j - 1]
+        elements = lambda start, stop: synthetic_elements(body, np.arange(start, stop) * step)
+        write_rows(base + ".elm.dat", elements, nrows)
+        write_rows(base + ".dat", lambda start, stop: elements_to_cartesian(elements(start, stop), body[1]), nrows)
+    return(directory)
+
+#######################################################################
+#                    checks of the blender builders                   #
+#######################################################################
+
+def benchmark_materials(matname = "benchmark_gpencil"):
+    """
+    Make sure the materials the builders look up exist, also in an empty file
+    """
+    import bpy
+    if 'Material' not in bpy.data.materials:
+        bpy.data.materials.new('Material')
+    if matname not in bpy.data.materials:
+        mat = bpy.data.materials.new(matname)
+        bpy.data.materials.create_gpencil_data(mat)
+    return(matname)
+
+def benchmark_make_mesh(nrows = 10**6, make_edges = True, step = -400 * 365.25):
+    """
+    Time make_mesh with and without the bulk path on synthetic Earth output,
+    and check that both produce the same mesh
+    """
+    import bpy
+    earth = bodies[2]
+    data = elements_to_cartesian(synthetic_elements(earth, np.arange(nrows) * step), earth[1])
+    collection = vo.make_collection("benchmark_make_mesh")
+    timings = {}
+    meshes = {}
+    for bulk in (True, False):
+        start = time.perf_counter()
+        obj, mesh = vo.make_mesh(data, meshname = f"bench_bulk_{bulk}", objname = f"bench_bulk_{bulk}",
+                                 color = (1, 1, 1, 1), material = None, collection = collection,
+                                 make_edges = make_edges, bulk = bulk)
+        timings[bulk] = time.perf_counter() - start
+        meshes[bulk] = mesh
+    # compare the two results
+    def get_buffers(collection, attr, size, dtype = np.float32):
+        buffers = []
+        for mesh in meshes.values():
+            buf = np.empty(size, dtype = dtype)
+            collection(mesh).foreach_get(attr, buf)
+            buffers.append(buf)
+        return(buffers)
+    co = get_buffers(lambda mesh: mesh.vertices, "co", nrows * 3)
+    assert np.array_equal(*co), "vertex positions differ"
+    for name in vo.mesh_attributes:
+        values = get_buffers(lambda mesh: mesh.attributes[name].data, "value", nrows)
+        assert np.array_equal(*values), f"attribute {name} differs"
+    if make_edges:
+        edges = get_buffers(lambda mesh: mesh.edges, "vertices", (nrows - 1) * 2, dtype = np.int32)
+        assert np.array_equal(*edges), "edges differ"
+    print(f"make_mesh with {nrows} rows: bulk {timings[True]:.2f} s, "
+          f"loop {timings[False]:.2f} s ({timings[False] / timings[True]:.0f}x faster)")
+    # clean up after ourselves
+    for mesh in meshes.values():
+        bpy.data.meshes.remove(mesh)
+    bpy.data.collections.remove(collection)
+    return(timings)
+
+def benchmark_element_curves(tmaxes = (405, 2.4e3, 60e3), dt = 0.4, step = -400 * 365.25):
+    """
+    Time drawing an eccentricity curve with a moving planet for synthetic
+    Earth output of increasing length, to check that the cost grows linearly
+    """
+    import bpy
+    collection = vo.make_collection("benchmark_element_curves")
+    matname = benchmark_materials()
+    timings = {}
+    for tmax in tmaxes:
+        nrows = math.ceil(tmax * 1e3 / abs(step / 365.25)) + 1
+        data = vo.subset_data(synthetic_elements(bodies[2], np.arange(nrows) * step), tmax = tmax, dt = dt)
+        start = time.perf_counter()
+        vo.draw_element_curve(vo.element_curve_points(data, "e"), 3,
+                              gpname = f"bench_{tmax}", objname = f"bench_{tmax}",
+                              matname = matname, emptyname = f"bench_position_{tmax}",
+                              spherename = f"bench_body_{tmax}", collection = collection)
+        timings[tmax] = time.perf_counter() - start
+        print(f"element curve for {tmax} kyr ({len(data)} rows): {timings[tmax]:.2f} s, "
+              f"{timings[tmax] / len(data) * 1e6:.1f} µs per row")
+    # clean up after ourselves
+    for obj in list(collection.objects):
+        bpy.data.objects.remove(obj)
+    bpy.data.collections.remove(collection)
+    return(timings)
+
+#######################################################################
+#                             benchmarks                              #
+#######################################################################
+
+def blender_stages(data, elements, N = int(360/5)):
+    """
+    The stages that need blender, each a function that returns the datablocks
+    it created so they can be removed afterwards, or a (setup, stage) pair
+    where setup returns the arguments of stage and isn't timed
+    """
+    import bpy
+    matname = benchmark_materials()
+    collection = bpy.data.collections.get("benchmark") or vo.make_collection("benchmark")
+    def make_mesh():
+        obj, mesh = vo.make_mesh(data, meshname = "bench", objname = "bench", color = (1, 1, 1, 1),
+                                 material = None, collection = collection)
+        return([obj, mesh])
+    def make_gpencil():
+        obj, gpd, *rest = vo.make_gpencil(data[:, 1:4], gpname = "bench", objname = "bench",
+                                          collection = collection, matname = matname, type = "points")
+        return([obj, gpd])
+    def animate_planet():
+        empty = bpy.data.objects.new("bench", None)
+        vo.animate_planet(data, empty)
+        return([empty, empty.animation_data.action])
+    def make_orbit_gpencil():
+        # the bulk path: orbit_ellipses and animate_orbit_points
+        obj = vo.make_orbit_gpencil(elements, gpname = "bench", objname = "bench", matname = matname,
+                                    collection = collection, N = N)
+        return([obj, obj.data])
+    def orbit_setup():
+        # the pyorb orbits (timed as assign_orbit_data) and the first frame
+        orb = vo.assign_orbit_data(elements)
+        gpencil = vo.make_gpencil(vo.orbit_points(orb[0], N = N), gpname = "bench", objname = "bench",
+                                  collection = collection, matname = matname, type = "orbit")
+        return(orb, gpencil)
+    def animate_orbit(orb, gpencil):
+        obj, gpd, gp_layer, gp_frame, gp_stroke = gpencil
+        vo.animate_orbit(elements, orb, gp_layer, gp_frame, gp_stroke, N = N)
+        return([obj, gpd])
+    return({"make_mesh": make_mesh, "make_gpencil": make_gpencil, "animate_planet": animate_planet,
+            "make_orbit_gpencil": make_orbit_gpencil, "animate_orbit": (orbit_setup, animate_orbit)})
+
+def remove_datablocks(blocks):
+    """
+    Remove objects and their data that a blender stage created
+    """
+    import bpy
+    for block in blocks:
+        if isinstance(block, bpy.types.Object):
+            bpy.data.objects.remove(block)
+        elif isinstance(block, bpy.types.Mesh):
+            bpy.data.meshes.remove(block)
+        elif isinstance(block, bpy.types.GreasePencil):
+            bpy.data.grease_pencils.remove(block)
+        elif isinstance(block, bpy.types.Action):
+            bpy.data.actions.remove(block)
+
+def time_stage(stage, repeat = 1, setup = None):
+    """
+    Best wall time of repeat runs of stage, and what it returned. setup
+    returns the arguments of stage, it isn't timed.
+    """
+    best = math.inf
+    for _ in range(repeat):
+        args = setup() if setup is not None else ()
+        start = time.perf_counter()
+        result = stage(*args)
+        best = min(best, time.perf_counter() - start)
+    return(best, result)
+
+def run_benchmarks(sizes = (10**4, 10**5, 10**6, 10**7), budget = 60.0, workdir = None, N = int(360/5),
+                   progress = None):
+    """
+    Time each stage for synthetic output of each size (rows). A stage that
+    took longer than budget seconds, or that would at the next size going by
+    its time at the last one, is skipped for larger sizes, and so is a stage
+    that failed (e.g. with a MemoryError). progress(results) is called after
+    each result so they can be saved as they come in.
+    Returns a list of result dicts.
+    """
+    try:
+        import bpy
+    except ImportError:
+        bpy = None
+    workdir = workdir or tempfile.mkdtemp(prefix = "orbitN-bench-")
+    results = []
+    last = {}
+    stopped = {}
+    def record(stage, nrows, seconds = None, reason = None, error = None):
+        result = {"stage": stage, "rows": nrows}
+        if error is not None:
+            result.update({"status": "failed", "error": f"{type(error).__name__}: {error}"})
+            message = f"FAILED ({result['error']})"
+        elif reason is not None:
+            result.update({"status": "skipped", "reason": reason})
+            message = f"skipped ({reason})"
+        else:
+            result.update({"status": "ok", "seconds": seconds, "rows_per_second": nrows / seconds if seconds else None})
+            message = f"{seconds:.3f} s"
+        print(f"{stage:>20} {nrows:>10}: {message}", flush = True)
+        results.append(result)
+        if progress is not None:
+            progress(results)
+    def attempt(stage, nrows, run, needs = (), inputs = None, setup = None):
+        """
+        Time run unless the stage is skipped, returns what it returned or None
+        """
+        if stage not in stopped and stage in last:
+            rows, seconds = last[stage]
+            expected = seconds * nrows / rows
+            if expected > budget:
+                stopped[stage] = f"expected to take {expected:.3g} s at {nrows} rows"
+        if stage in stopped:
+            record(stage, nrows, reason = stopped[stage])
+            return(None)
+        for name in needs:
+            if inputs[name] is None:
+                record(stage, nrows, reason = f"no {name} to work on")
+                return(None)
+        try:
+            seconds, result = time_stage(run, setup = setup)
+        except Exception as error:
+            stopped[stage] = f"failed at {nrows} rows"
+            record(stage, nrows, error = error)
+            return(None)
+        last[stage] = (nrows, seconds)
+        if seconds > budget:
+            stopped[stage] = f"over {budget} s at {nrows} rows"
+        record(stage, nrows, seconds)
+        return(result)
+    def load(loader):
+        # the inputs of the later stages, also when their own stage is skipped
+        try:
+            return(loader())
+        except Exception as error:
+            print(f"could not load the input: {type(error).__name__}: {error}", flush = True)
+            return(None)
+    for nrows in sizes:
+        directory = load(lambda: write_experiment(os.path.join(workdir, f"rows{nrows}"), nrows, bodies_to_write = [3]))
+        datafile = os.path.join(directory or workdir, "orbitN-3.dat")
+        elmfile = os.path.join(directory or workdir, "orbitN-3.elm.dat")
+        inputs = {}
+        inputs["data"] = attempt("get_data", nrows, lambda: vo.get_data(datafile))
+        if inputs["data"] is None and directory is not None:
+            inputs["data"] = load(lambda: vo.get_data(datafile))
+        inputs["elements"] = load(lambda: vo.get_data(elmfile)) if directory is not None else None
+        attempt("subset_data", nrows, lambda: vo.subset_data(inputs["data"], tmax = nrows * 0.2, dt = 0.8),
+                needs = ["data"], inputs = inputs)
+        inputs["orb"] = attempt("assign_orbit_data", nrows, lambda: vo.assign_orbit_data(inputs["elements"]),
+                                needs = ["elements"], inputs = inputs)
+        attempt("orbit_points", nrows, lambda: [vo.orbit_points(inputs["orb"][f], N = N) for f in range(len(inputs["elements"]))],
+                needs = ["orb"], inputs = inputs)
+        inputs["orb"] = None
+        attempt("orbit_ellipses", nrows, lambda: vo.orbit_ellipses(inputs["elements"][:, 1:6], N = N),
+                needs = ["elements"], inputs = inputs)
+        attempt("kepler_to_cartesian", nrows, lambda: vo.orbit_cartesian(inputs["elements"]),
+                needs = ["elements"], inputs = inputs)
+        if bpy is None:
+            for stage in ("make_mesh", "make_gpencil", "animate_planet", "make_orbit_gpencil", "animate_orbit"):
+                record(stage, nrows, reason = "blender not available")
+            continue
+        for stage, run in blender_stages(inputs["data"], inputs["elements"], N = N).items():
+            setup, run = run if isinstance(run, tuple) else (None, run)
+            blocks = attempt(stage, nrows, run, needs = ["data", "elements"], inputs = inputs, setup = setup)
+            if blocks is not None:
+                remove_datablocks(blocks)
+    return(results)
+
+def environment():
+    """
+    Where the benchmarks ran, to put next to the results
+    """
+    info = {"date": datetime.datetime.now().isoformat(timespec = "seconds"),
+            "python": platform.python_version(),
+            "numpy": np.__version__,
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count()}
+    if "bpy" in sys.modules:
+        info["blender"] = sys.modules["bpy"].app.version_string
+    return(info)
+
+def compare_results(results, baseline, tolerance = 1.2, min_seconds = 0.05):
+    """
+    Stages (and sizes) that got more than tolerance times slower than in the
+    baseline results, ignoring timings below min_seconds that are mostly noise
+    """
+    before = {(r["stage"], r["rows"]): r["seconds"] for r in baseline if r["status"] == "ok"}
+    regressions = []
+    for r in results:
+        key = (r["stage"], r["rows"])
+        if (r["status"] == "ok" and key in before and r["seconds"] > min_seconds
+                and r["seconds"] > tolerance * before[key]):
+            regressions.append({"stage": r["stage"], "rows": r["rows"],
+                                "seconds": r["seconds"], "baseline": before[key]})
+    return(regressions)
+
+def write_report(filename, report):
+    """
+    Replace filename with the report in one go
+    """
+    with open(filename + ".tmp", 'w') as f:
+        json.dump(report, f, indent = 2)
+    os.replace(filename + ".tmp", filename)
+
+def main(args):
+    parser = argparse.ArgumentParser(prog = "benchmark_orbitN.py", description = "Benchmark visualise_orbitN on synthetic data.")
+    parser.add_argument("--sizes", nargs = "+", type = float, default = [1e4, 1e5, 1e6, 1e7], help = "numbers of rows")
+    parser.add_argument("--budget", type = float, default = 60.0, help = "skip a stage for larger sizes once it takes this many seconds")
+    parser.add_argument("--output", default = "bench_output.json", help = "json file to write the results to")
+    parser.add_argument("--workdir", help = "directory for the synthetic output (default: a temporary directory)")
+    parser.add_argument("--compare", help = "earlier results to check for regressions")
+    parser.add_argument("--tolerance", type = float, default = 1.2, help = "slowdown factor that counts as a regression")
+    parser.add_argument("--generate", metavar = "DIRECTORY", help = "only write a synthetic experiment to DIRECTORY")
+    parser.add_argument("--rows", type = float, default = 1e5, help = "number of rows for --generate")
+    args = parser.parse_args(args)
+    if args.generate:
+        write_experiment(args.generate, int(args.rows))
+        return(0)
+    report = {"environment": environment(), "results": []}
+    def save(results):
+        # write after every result, so a crash at a large size keeps the rest
+        report["results"] = results
+        write_report(args.output, report)
+    results = run_benchmarks([int(size) for size in args.sizes], budget = args.budget, workdir = args.workdir,
+                             progress = save)
+    if args.compare:
+        with open(args.compare) as f:
+            report["regressions"] = compare_results(results, json.load(f)["results"], args.tolerance)
+    save(results)
+    for r in report.get("regressions", []):
+        print(f"regression: {r['stage']} at {r['rows']} rows took {r['seconds']:.3f} s, was {r['baseline']:.3f} s")
+    return(1 if report.get("regressions") else 0)
+
+if __name__ == "__main__":
+    sys.exit(main(script_args()))
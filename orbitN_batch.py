@@ -0,0 +1,281 @@
+# This file is part of the vis-orbitN distribution (https://github.com/japhir/vis-orbitN).
+# Copyright (c) 2023 Ilja J. Kocken
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Build and render many orbitN experiments headless.
+
+Run the jobs in a job file, several Blender processes at a time:
+
+    python orbitN_batch.py jobs.json --processes 4
+    blender -b --python orbitN_batch.py -- jobs.json --processes 4
+
+Each job is run in its own `blender -b` process that calls this script again
+with --run-job. A job file looks like this (all paths relative to the job
+file):
+
+    {
+      "basedir": "/path/to/orbitN/sim/",
+      "blender": "blender",
+      "jobs": [
+        {"name": "keplerian-405kyr",
+         "exp": "solsys-keplerian",
+         "blend": "visualise_orbitN.blend",
+         "modes": ["meshes", "animated_orbits", "eccentricity"],
+         "tmax": 405, "dt": 0.8,
+         "options": {"meshes": {"outext": ".dat", "dt": 1}},
+         "save": "out/keplerian-405kyr.blend",
+         "render": {"output": "out/keplerian-405kyr/####.png",
+                    "frame_start": 1, "frame_end": 250}}
+      ]
+    }
+
+The exit status is 0 when all jobs succeeded, 1 when any job failed and 2
+when the job file could not be used.
+"""
+
+import argparse
+import inspect
+import json
+import os
+import subprocess
+import sys
+import traceback
+
+from concurrent.futures import ThreadPoolExecutor
+
+# the builder for each mode, and its default arguments besides exp/tmax/dt
+modes = {
+    "meshes": ("make_meshes", {"outext": ".dat", "workers": 1}),
+    "animated_orbits": ("make_animated_orbits", {"outext": ".elm.dat", "workers": 1}),
+    "eccentricity": ("make_eccentricity_curve", {"outext": ".elm.dat"}),
+    "element_curves": ("make_element_curves", {"outext": ".elm.dat"}),
+    "trails": ("make_trails", {"outext": ".dat", "workers": 1}),
+}
+
+EXIT_OK = 0
+EXIT_FAILED = 1
+EXIT_USAGE = 2
+
+def script_args():
+    """
+    Arguments for this script, also when blender passes its own before --
+    """
+    if "--" in sys.argv:
+        return(sys.argv[sys.argv.index("--") + 1:])
+    if "bpy" in sys.modules:
+        # blender without -- only has its own arguments
+        return([])
+    return(sys.argv[1:])
+
+def is_number(value):
+    # json true and false are bools, which python also counts as ints
+    return(isinstance(value, (int, float)) and not isinstance(value, bool))
+
+def builder_arguments(name):
+    """
+    The keyword arguments of the builder called name, including those of the
+    instrumented wrapper (report, trace_memory)
+    """
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import visualise_orbitN as vo
+    builder = getattr(vo, name)
+    arguments = set()
+    for signature in (inspect.signature(builder), inspect.signature(builder, follow_wrapped = False)):
+        arguments.update(key for key, parameter in signature.parameters.items()
+                         if parameter.kind in (parameter.POSITIONAL_OR_KEYWORD, parameter.KEYWORD_ONLY))
+    return(arguments - {"exp"})
+
+def read_jobs(jobfile):
+    """
+    Read the job file, check it, and make its paths absolute
+    """
+    with open(jobfile) as f:
+        spec = json.load(f)
+    root = os.path.dirname(os.path.abspath(jobfile))
+    def resolve(path):
+        return(os.path.normpath(os.path.join(root, os.path.expanduser(path))))
+    if not isinstance(spec, dict):
+        raise ValueError(f"{jobfile} should contain a json object with a list of jobs")
+    jobs = spec.get("jobs", [])
+    if not isinstance(jobs, list):
+        raise ValueError(f"jobs in {jobfile} should be a list")
+    if not jobs:
+        raise ValueError(f"no jobs in {jobfile}")
+    processes = spec.get("processes")
+    if processes is not None and not (isinstance(processes, int) and not isinstance(processes, bool)
+                                      and processes > 0):
+        raise ValueError(f"processes in {jobfile} should be a positive whole number, not {processes!r}")
+    names = set()
+    for k, job in enumerate(jobs):
+        if not isinstance(job, dict):
+            raise ValueError(f"job {k} in {jobfile} should be a json object")
+        job.setdefault("name", f"job{k}")
+        # the name is that of the job's log file
+        name = job["name"]
+        if not isinstance(name, str) or name in ("", ".", "..") or "/" in name or os.sep in name:
+            raise ValueError(f"job {k} in {jobfile} has name {name!r}, which can't be a file name")
+        if name in names:
+            raise ValueError(f"there is more than one job called {name} in {jobfile}")
+        names.add(name)
+        for key in ("exp", "modes"):
+            if key not in job:
+                raise ValueError(f"job {job['name']} has no {key}")
+        if not isinstance(job["modes"], list):
+            raise ValueError(f"the modes of job {job['name']} should be a list")
+        unknown = [mode for mode in job["modes"] if mode not in modes]
+        if unknown:
+            raise ValueError(f"job {job['name']} has unknown modes {unknown}, use {list(modes)}")
+        for key in ("tmax", "dt"):
+            if key in job and not is_number(job[key]):
+                raise ValueError(f"{key} of job {job['name']} should be a number, not {job[key]!r}")
+        options = job.get("options", {})
+        if not isinstance(options, dict):
+            raise ValueError(f"the options of job {job['name']} should be a json object")
+        for mode, kwargs in options.items():
+            if mode not in modes:
+                raise ValueError(f"job {job['name']} has options for unknown mode {mode}, use {list(modes)}")
+            if not isinstance(kwargs, dict):
+                raise ValueError(f"the {mode} options of job {job['name']} should be a json object")
+            unknown = sorted(set(kwargs) - builder_arguments(modes[mode][0]))
+            if unknown:
+                raise ValueError(f"the {mode} options of job {job['name']} have unknown arguments {unknown} "
+                                 f"of {modes[mode][0]}")
+            for key in ("tmax", "dt"):
+                if key in kwargs and not is_number(kwargs[key]):
+                    raise ValueError(f"{key} in the {mode} options of job {job['name']} should be a number, "
+                                     f"not {kwargs[key]!r}")
+        if "basedir" not in job and "basedir" in spec:
+            job["basedir"] = spec["basedir"]
+        for key in ("blend", "save", "basedir"):
+            if key in job:
+                if not isinstance(job[key], str):
+                    raise ValueError(f"{key} of job {job['name']} should be a path")
+                job[key] = resolve(job[key])
+        if "render" in job:
+            render = job["render"]
+            if not isinstance(render, dict) or not isinstance(render.get("output"), str):
+                raise ValueError(f"render of job {job['name']} needs an output path")
+            render["output"] = resolve(render["output"])
+    return(spec, jobs)
+
+#######################################################################
+#                     run a single job in blender                     #
+#######################################################################
+
+def run_job(job):
+    """
+    Build the scene for one job, then save and/or render it
+    """
+    import bpy
+    sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+    import visualise_orbitN as vo
+    if "basedir" in job:
+        vo.SIM_DIR = job["basedir"]
+    for mode in job["modes"]:
+        name, defaults = modes[mode]
+        kwargs = dict(defaults)
+        for key in ("tmax", "dt"):
+            if key in job:
+                kwargs[key] = job[key]
+        kwargs.update(job.get("options", {}).get(mode, {}))
+        print(f"{job['name']}: {name}({job['exp']!r}, {kwargs})", flush = True)
+        getattr(vo, name)(job["exp"], **kwargs)
+    if "save" in job:
+        os.makedirs(os.path.dirname(job["save"]), exist_ok = True)
+        bpy.ops.wm.save_as_mainfile(filepath = job["save"])
+    if "render" in job:
+        render = job["render"]
+        scene = bpy.context.scene
+        scene.frame_start = render.get("frame_start", scene.frame_start)
+        scene.frame_end = render.get("frame_end", scene.frame_end)
+        scene.render.filepath = render["output"]
+        bpy.ops.render.render(animation = True)
+
+def run_job_in_blender(jobfile, index):
+    """
+    Entry point inside `blender -b`, returns the exit status
+    """
+    try:
+        spec, jobs = read_jobs(jobfile)
+        run_job(jobs[index])
+    except Exception:
+        traceback.print_exc()
+        return(EXIT_FAILED)
+    return(EXIT_OK)
+
+#######################################################################
+#               launch blender processes for all jobs                 #
+#######################################################################
+
+def launch_job(blender, jobfile, index, job, logdir):
+    """
+    Run one job in its own headless blender process, logging its output
+    """
+    command = [blender, "-b"]
+    if "blend" in job:
+        command.append(job["blend"])
+    command += ["--python-exit-code", str(EXIT_FAILED),
+                "--python", os.path.abspath(__file__),
+                "--", "--run-job", os.path.abspath(jobfile), str(index)]
+    logfile = os.path.join(logdir, job["name"] + ".log")
+    with open(logfile, 'w') as log:
+        try:
+            returncode = subprocess.run(command, stdout = log, stderr = subprocess.STDOUT).returncode
+        except OSError as error:
+            log.write(f"could not start blender: {error}\n")
+            returncode = EXIT_FAILED
+    status = "done" if returncode == 0 else f"FAILED ({returncode}), see {logfile}"
+    print(f"{job['name']}: {status}", flush = True)
+    return(returncode)
+
+def run_batch(jobfile, processes = None, blender = None, logdir = None):
+    """
+    Run all jobs in the job file, processes blender instances at a time
+    """
+    try:
+        spec, jobs = read_jobs(jobfile)
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file = sys.stderr)
+        return(EXIT_USAGE)
+    blender = blender or spec.get("blender") or os.environ.get("BLENDER", "blender")
+    processes = processes or spec.get("processes") or os.cpu_count() or 1
+    logdir = logdir or os.path.join(os.path.dirname(os.path.abspath(jobfile)), "logs")
+    os.makedirs(logdir, exist_ok = True)
+    with ThreadPoolExecutor(max_workers = processes) as pool:
+        returncodes = list(pool.map(lambda k: launch_job(blender, jobfile, k, jobs[k], logdir), range(len(jobs))))
+    failed = sum(returncode != 0 for returncode in returncodes)
+    print(f"{len(jobs) - failed} of {len(jobs)} jobs succeeded")
+    return(EXIT_OK if failed == 0 else EXIT_FAILED)
+
+def main(args):
+    parser = argparse.ArgumentParser(prog = "orbitN_batch.py", description = "Build and render orbitN experiments in Blender.")
+    parser.add_argument("jobfile", nargs = "?", help = "json file with the jobs to run")
+    parser.add_argument("--processes", "-j", type = int, help = "number of blender processes at a time (default: number of cores)")
+    parser.add_argument("--blender", help = "blender executable (default: from the job file, $BLENDER or blender)")
+    parser.add_argument("--logdir", help = "directory for the log of each job (default: logs next to the job file)")
+    parser.add_argument("--run-job", nargs = 2, metavar = ("JOBFILE", "INDEX"), help = argparse.SUPPRESS)
+    args = parser.parse_args(args)
+    if args.run_job:
+        return(run_job_in_blender(args.run_job[0], int(args.run_job[1])))
+    if args.jobfile is None:
+        parser.print_usage(sys.stderr)
+        return(EXIT_USAGE)
+    if "bpy" in sys.modules and args.blender is None:
+        # started as blender -b --python, launch the same blender for the jobs
+        args.blender = sys.modules["bpy"].app.binary_path
+    return(run_batch(args.jobfile, processes = args.processes, blender = args.blender, logdir = args.logdir))
+
+if __name__ == "__main__":
+    sys.exit(main(script_args()))
@@ -0,0 +1,283 @@
+# This file is part of the vis-orbitN distribution (https://github.com/japhir/vis-orbitN).
+# Copyright (c) 2023 Ilja J. Kocken
+#
+# This program is free software: you can redistribute it and/or modify
+# it under the terms of the GNU General Public License as published by
+# the Free Software Foundation, version 3.
+#
+# This program is distributed in the hope that it will be useful, but
+# WITHOUT ANY WARRANTY; without even the implied warranty of
+# MERCHANTABILITY or FITNESS FOR A PARTICULAR PURPOSE. See the GNU
+# General Public License for more details.
+#
+# You should have received a copy of the GNU General Public License
+# along with this program. If not, see <http://www.gnu.org/licenses/>.
+
+"""
+Render the animation of a saved .blend with several headless Blender
+processes at a time, then put the frames together into a video.
+
+    python render_orbitN.py animated_orbits.blend --processes 4 --video animated_orbits.mp4
+
+The frames of the scene (or --frames 1..250) are split into chunks of
+--chunk frames, and each chunk is rendered by its own `blender -b` process
+into --framedir (default: <blend>_frames next to the .blend). Every frame
+that Blender saves is written to frames.json in that directory, so running
+the same command again after an interruption only renders the missing
+frames. A chunk whose process crashes is started again for the frames that
+it didn't save, up to --retries times, while the other chunks carry on.
+Once all frames are there, ffmpeg makes the video of them in order (also
+when --frames has gaps, e.g. 1..10,20..30).
+
+The exit status is 0 when all frames (and the video) were made, 1 when some
+frames failed and 2 when the .blend or the arguments could not be used.
+"""
+
+import argparse
+import json
+import os
+import re
+import subprocess
+import sys
+import threading
+
+from concurrent.futures import ThreadPoolExecutor
+
+# blender doesn't put the directory of the script on the path
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+from orbitN_batch import EXIT_OK, EXIT_FAILED, EXIT_USAGE, script_args
+
+# the frames are saved as framedir/frame_0001.png etc.
+frame_prefix = "frame_"
+
+def print_scene():
+    """
+    Inside blender: print the frame range and frame rate of the scene
+    """
+    import bpy
+    scene = bpy.context.scene
+    info = {"frame_start": scene.frame_start, "frame_end": scene.frame_end,
+            "fps": scene.render.fps / scene.render.fps_base}
+    print("orbitN_scene " + json.dumps(info), flush = True)
+    return(EXIT_OK)
+
+def read_scene(blender, blend):
+    """
+    Ask blender for the frame range and frame rate of the scene in blend
+    """
+    command = [blender, "-b", blend, "--python-exit-code", str(EXIT_FAILED),
+               "--python", os.path.abspath(__file__), "--", "--print-scene"]
+    output = subprocess.run(command, capture_output = True, text = True).stdout
+    for line in output.splitlines():
+        if line.startswith("orbitN_scene "):
+            return(json.loads(line[len("orbitN_scene "):]))
+    raise ValueError(f"could not read the scene of {blend}:\n{output}")
+
+def parse_frames(text):
+    """
+    Frames from e.g. "1..250" or "1..10,20,30..40"
+    """
+    frames = set()
+    for part in text.split(","):
+        first, _, last = part.partition("..")
+        frames.update(range(int(first), int(last or first) + 1))
+    return(sorted(frames))
+
+def frame_ranges(frames):
+    """
+    Blender's -f syntax for a list of frames, e.g. [1, 2, 3, 5] -> "1..3,5"
+    """
+    ranges = []
+    for frame in sorted(frames):
+        if ranges and frame == ranges[-1][1] + 1:
+            ranges[-1][1] = frame
+        else:
+            ranges.append([frame, frame])
+    return(",".join(str(first) if first == last else f"{first}..{last}" for first, last in ranges))
+
+#######################################################################
+#                  keep track of the finished frames                  #
+#######################################################################
+
+def blend_signature(blend):
+    stat = os.stat(blend)
+    return({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+
+def read_manifest(framedir, blend):
+    """
+    Frames that were rendered from this version of blend and are still there
+    """
+    try:
+        with open(os.path.join(framedir, "frames.json")) as f:
+            manifest = json.load(f)
+    except (OSError, ValueError):
+        return({})
+    if manifest.get("signature") != blend_signature(blend):
+        print(f"{blend} changed since the frames in {framedir} were rendered, starting over")
+        return({})
+    return({int(frame): path for frame, path in manifest["frames"].items() if os.path.exists(path)})
+
+class Manifest:
+    """
+    The frames saved so far, written to frames.json after every frame
+    """
+    def __init__(self, framedir, blend, frames):
+        self.path = os.path.join(framedir, "frames.json")
+        self.signature = blend_signature(blend)
+        self.frames = dict(frames)
+        self.lock = threading.Lock()
+
+    def add(self, frame, path):
+        with self.lock:
+            self.frames[frame] = path
+            with open(self.path + ".tmp", 'w') as f:
+                json.dump({"signature": self.signature,
+                           "frames": {str(frame): path for frame, path in sorted(self.frames.items())}}, f)
+            os.replace(self.path + ".tmp", self.path)
+
+#######################################################################
+#                 render chunks in blender processes                  #
+#######################################################################
+
+# blender prints this after writing each frame
+saved_pattern = re.compile(r"Saved: '(.*" + frame_prefix + r"(\d+)\.\w+)'")
+
+def render_frames(blender, blend, frames, framedir, file_format, manifest, logfile, autoexec = False):
+    """
+    Render frames in one headless blender process, recording each saved frame
+    in the manifest as soon as it is written. Returns the exit status.
+    With autoexec the scripts in the .blend run (blender -y), which bins made
+    with make_binned_meshes(unload = True) need.
+    """
+    command = [blender] + (["-y"] if autoexec else []) + ["-b", blend,
+               "-o", os.path.join(framedir, frame_prefix + "####"), "-F", file_format, "-x", "1",
+               "-f", frame_ranges(frames)]
+    with open(logfile, 'a') as log:
+        log.write(" ".join(command) + "\n")
+        try:
+            process = subprocess.Popen(command, stdout = subprocess.PIPE, stderr = subprocess.STDOUT,
+                                       text = True, errors = "replace")
+        except OSError as error:
+            log.write(f"could not start blender: {error}\n")
+            return(EXIT_FAILED)
+        for line in process.stdout:
+            log.write(line)
+            saved = saved_pattern.search(line)
+            if saved:
+                manifest.add(int(saved.group(2)), saved.group(1))
+        return(process.wait())
+
+def render_chunk(blender, blend, frames, framedir, file_format, manifest, logdir, retries = 2, autoexec = False):
+    """
+    Render a chunk of frames, starting over for the frames that weren't
+    saved when blender crashes. Returns whether all frames were saved.
+    """
+    name = f"{frames[0]}-{frames[-1]}"
+    logfile = os.path.join(logdir, name + ".log")
+    for attempt in range(retries + 1):
+        todo = [frame for frame in frames if frame not in manifest.frames]
+        if not todo:
+            break
+        if attempt > 0:
+            print(f"frames {name}: starting again for {len(todo)} frames (attempt {attempt + 1})", flush = True)
+        returncode = render_frames(blender, blend, todo, framedir, file_format, manifest, logfile,
+                                   autoexec = autoexec)
+        if returncode != 0:
+            print(f"frames {name}: blender stopped with {returncode}, see {logfile}", flush = True)
+    missing = [frame for frame in frames if frame not in manifest.frames]
+    print(f"frames {name}: " + ("done" if not missing else f"FAILED, {len(missing)} frames missing"), flush = True)
+    return(not missing)
+
+def concat_entry(path):
+    # quotes in the path are closed, escaped and opened again
+    return("file '" + path.replace("'", "'\\''") + "'\n")
+
+def make_video(framedir, video, fps, paths, ffmpeg = "ffmpeg"):
+    """
+    Put the frames (their image paths, in order) together into a video with
+    ffmpeg. They are listed in framedir/video.txt for ffmpeg's concat demuxer,
+    so they don't have to be numbered one after the other.
+    """
+    listfile = os.path.join(framedir, "video.txt")
+    with open(listfile, 'w') as f:
+        for path in paths:
+            f.write(concat_entry(path) + f"duration {1 / fps!r}\n")
+        # ffmpeg only uses the duration of the last frame when it is listed again
+        f.write(concat_entry(paths[-1]))
+    command = [ffmpeg, "-y", "-f", "concat", "-safe", "0", "-i", listfile,
+               "-r", str(fps), "-c:v", "libx264", "-pix_fmt", "yuv420p", video]
+    print(" ".join(command), flush = True)
+    try:
+        return(subprocess.run(command).returncode)
+    except OSError as error:
+        print(f"could not start ffmpeg: {error}", file = sys.stderr)
+        return(EXIT_FAILED)
+
+def render(blend, processes = None, chunk = 25, frames = None, framedir = None, video = None,
+           blender = None, ffmpeg = "ffmpeg", retries = 2, file_format = "PNG", autoexec = False):
+    """
+    Render frames (default: all frames of the scene) of blend, processes
+    blender instances at a time, and make a video of them
+    """
+    blend = os.path.abspath(blend)
+    blender = blender or os.environ.get("BLENDER", "blender")
+    processes = processes or os.cpu_count() or 1
+    try:
+        scene = read_scene(blender, blend)
+    except (OSError, ValueError) as error:
+        print(f"error: {error}", file = sys.stderr)
+        return(EXIT_USAGE)
+    frames = frames or list(range(scene["frame_start"], scene["frame_end"] + 1))
+    framedir = os.path.abspath(framedir or os.path.splitext(blend)[0] + "_frames")
+    logdir = os.path.join(framedir, "logs")
+    os.makedirs(logdir, exist_ok = True)
+    manifest = Manifest(framedir, blend, read_manifest(framedir, blend))
+    todo = [frame for frame in frames if frame not in manifest.frames]
+    print(f"{len(frames) - len(todo)} of {len(frames)} frames already rendered", flush = True)
+    chunks = [todo[k:k + chunk] for k in range(0, len(todo), chunk)]
+    with ThreadPoolExecutor(max_workers = processes) as pool:
+        list(pool.map(lambda frames: render_chunk(blender, blend, frames, framedir, file_format,
+                                                  manifest, logdir, retries = retries,
+                                                  autoexec = autoexec), chunks))
+    missing = [frame for frame in frames if frame not in manifest.frames]
+    if missing:
+        print(f"{len(missing)} frames failed: {frame_ranges(missing)}, run again to retry them")
+        return(EXIT_FAILED)
+    if video is not None:
+        # the paths blender saved to have the right extension (.jpg for JPEG)
+        paths = [manifest.frames[frame] for frame in frames]
+        if make_video(framedir, video, scene["fps"], paths, ffmpeg) != 0:
+            return(EXIT_FAILED)
+    return(EXIT_OK)
+
+def main(args):
+    parser = argparse.ArgumentParser(prog = "render_orbitN.py", description = "Render a .blend with several Blender processes.")
+    parser.add_argument("blend", nargs = "?", help = "the saved .blend file to render")
+    parser.add_argument("--processes", "-j", type = int, help = "number of blender processes at a time (default: number of cores)")
+    parser.add_argument("--chunk", type = int, default = 25, help = "frames per blender process (default: 25)")
+    parser.add_argument("--frames", type = parse_frames, help = "frames to render, e.g. 1..250 (default: those of the scene)")
+    parser.add_argument("--framedir", help = "directory for the frames (default: <blend>_frames)")
+    parser.add_argument("--video", help = "make this video of the frames with ffmpeg, e.g. movie.mp4")
+    parser.add_argument("--retries", type = int, default = 2, help = "times to start a crashed chunk again (default: 2)")
+    parser.add_argument("--blender", help = "blender executable (default: $BLENDER or blender)")
+    parser.add_argument("--ffmpeg", default = "ffmpeg", help = "ffmpeg executable (default: ffmpeg)")
+    parser.add_argument("--autoexec", action = "store_true", help = "let the scripts in the .blend run (blender -y)")
+    parser.add_argument("--print-scene", action = "store_true", help = argparse.SUPPRESS)
+    args = parser.parse_args(args)
+    if args.print_scene:
+        return(print_scene())
+    if args.blend is None:
+        parser.print_usage(sys.stderr)
+        return(EXIT_USAGE)
+    if not os.path.exists(args.blend):
+        print(f"error: {args.blend} does not exist", file = sys.stderr)
+        return(EXIT_USAGE)
+    if "bpy" in sys.modules and args.blender is None:
+        # started as blender -b --python, launch the same blender for the chunks
+        args.blender = sys.modules["bpy"].app.binary_path
+    return(render(args.blend, processes = args.processes, chunk = args.chunk, frames = args.frames,
+                  framedir = args.framedir, video = args.video, blender = args.blender,
+                  ffmpeg = args.ffmpeg, retries = args.retries, autoexec = args.autoexec))
+
+if __name__ == "__main__":
+    sys.exit(main(script_args()))
@@ -13,30 +13,59 @@
 # You should have received a copy of the GNU General Public License
 # along with this program. If not, see <http://www.gnu.org/licenses/>.
 
-import bpy
+try:
+    import bpy
+    import mathutils
+except ImportError:
+    # outside of blender (e.g. in worker processes) only the data handling works
+    bpy = None
+
+if bpy is not None:
+    # install this blender plugin:
+    from bpybb.color import hex_color_to_rgba
 
-import mathutils
 import numpy as np
+import contextlib
+import datetime
+import functools
+import hashlib
+import importlib
+import json
 import math
+import mmap
+import multiprocessing
+import os
 import pyorb
+import sys
+import threading
+import time
+import tracemalloc
+import zlib
 
-from math import tau, pi, sin, cos
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait
+from multiprocessing import shared_memory
 
-# install this blender plugin:
-from bpybb.color import hex_color_to_rgba
+from math import tau, pi, sin, cos
 
 #######################################################################
 #                       parse the input file!                         #
 #######################################################################
 
+# the orbitN sim directory with one subdirectory per experiment, change it
+# here or set the ORBITN_SIM_DIR environment variable
+SIM_DIR = os.environ.get("ORBITN_SIM_DIR",
+                         "/home/japhir/SurfDrive/Postdoc1/prj/2023-05-08_orbitN/orbitN-0.4.0/sim/")
+
 def get_files(exp = "modern-highres/",
               infile = "orbitN-coord.inp",
               outext = ".dat",
-              basedir = "/home/japhir/SurfDrive/Postdoc1/prj/2023-05-08_orbitN/orbitN-0.4.0/sim/"):
+              basedir = None):
     """
     make path and file names out of directories and experiments
     """
-    path = basedir + exp + "/"
+    if basedir is None:
+        basedir = SIM_DIR
+    path = os.path.join(basedir, exp, "")
     # read in planet masses, relative to the sun's mass
     inputfile = path + infile
     basename = "orbitN-"
@@ -78,9 +107,23 @@ def get_inp(inputfile):
 # read in the planet's positions and velocities for each timestep t   #
 #######################################################################
 
-def get_data(filename):
+def get_data(filename, parser = "numpy", nthreads = None):
     """
     Read in the data from the output file
+
+    By default the file is parsed straight into a 2D numpy array (one row per
+    timestep), in parallel for large files. Set parser to "python" to use the
+    original list-of-lists parser, e.g. to check results.
+    """
+    if parser == "python":
+        return(get_data_python(filename))
+    elif parser == "numpy":
+        return(get_data_numpy(filename, nthreads = nthreads))
+    raise ValueError(f"parser must be 'numpy' or 'python': {parser}")
+
+def get_data_python(filename):
+    """
+    Read in the data from the output file as a list of lists of floats
     """
     with open(filename, 'r') as f:
         lines = f.readlines()
@@ -89,6 +132,91 @@ def get_data(filename):
     # data = data[:50]
     return(data)
 
+def parse_block(block, ncols, dtype = np.float64, offset = 0):
+    """
+    Parse a block of complete lines of whitespace-separated numbers into an
+    array with ncols columns. offset is where the block starts in the file,
+    to say where a line with a different number of columns is.
+    """
+    # the text parser of fromstring treats newlines as whitespace too, and
+    # doesn't hold on to the GIL so we can run it from several threads
+    values = np.fromstring(block, dtype = dtype, sep = " ")
+    # so a line with a number too few and one with one too many would still
+    # add up to whole rows, count the numbers on each line
+    check_columns(block, ncols, offset)
+    if values.size % ncols != 0:
+        raise ValueError(f"the block at byte {offset} does not contain complete rows of {ncols} columns")
+    return(values.reshape(-1, ncols))
+
+def check_columns(block, ncols, offset = 0):
+    """
+    Raise a ValueError with the byte in the file where it starts when a line
+    in block doesn't have ncols numbers (blank lines are fine)
+    """
+    text = np.frombuffer(block, dtype = np.uint8)
+    space = (text == ord(" ")) | (text == ord("\n")) | (text == ord("\t")) | (text == ord("\r"))
+    # a number starts where a space is followed by something else
+    starts = np.flatnonzero(~space & np.concatenate(([True], space[:-1])))
+    newlines = np.flatnonzero(text == ord("\n"))
+    ends = newlines if block.endswith(b"\n") else np.append(newlines, len(text))
+    numbers = np.diff(np.searchsorted(starts, ends), prepend = 0)
+    bad = np.flatnonzero((numbers != 0) & (numbers != ncols))
+    if bad.size > 0:
+        line = bad[0]
+        start = newlines[line - 1] + 1 if line > 0 else 0
+        raise ValueError(f"the line at byte {offset + start} has {numbers[line]} columns, not {ncols}")
+
+def get_chunk_bounds(buffer, nchunks):
+    """
+    Split a buffer into at most nchunks byte ranges that end on a newline
+    """
+    size = len(buffer)
+    bounds = [0]
+    for k in range(1, nchunks):
+        newline = buffer.find(b"\n", max(size * k // nchunks, bounds[-1]))
+        if newline == -1:
+            break
+        if newline + 1 > bounds[-1]:
+            bounds.append(newline + 1)
+    if bounds[-1] < size:
+        bounds.append(size)
+    return(list(zip(bounds[:-1], bounds[1:])))
+
+def get_data_numpy(filename, nthreads = None, chunk_bytes = 2**25, dtype = np.float64, order = "C"):
+    """
+    Read in the data from the output file as a contiguous 2D numpy array
+
+    Files larger than chunk_bytes are split into byte ranges on line
+    boundaries that are parsed by nthreads threads (default: all cores).
+    The numbers are parsed straight into dtype, and with order = "F" each
+    column is contiguous instead of each row.
+    """
+    with open(filename, 'rb') as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return(np.empty((0, 0), dtype = dtype))
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+            # the number of columns follows from the first line
+            first_line = mm.find(b"\n")
+            ncols = len(mm[:first_line if first_line != -1 else len(mm)].split())
+            nthreads = nthreads or os.cpu_count() or 1
+            nchunks = 1 if len(mm) < chunk_bytes else max(nthreads, len(mm) // chunk_bytes)
+            bounds = get_chunk_bounds(mm, nchunks)
+            if len(bounds) == 1 or nthreads == 1:
+                blocks = [parse_block(mm[start:end], ncols, dtype, start) for start, end in bounds]
+            else:
+                with ThreadPoolExecutor(max_workers = nthreads) as pool:
+                    blocks = list(pool.map(lambda b: parse_block(mm[b[0]:b[1]], ncols, dtype, b[0]), bounds))
+    if len(blocks) == 1 and order == "C":
+        return(blocks[0])
+    data = np.empty((sum(len(block) for block in blocks), ncols), dtype = dtype, order = order)
+    row = 0
+    for k in range(len(blocks)):
+        # let go of each block once it's copied, so the memory is reused
+        block, blocks[k] = blocks[k], None
+        data[row:row + len(block)] = block
+        row += len(block)
+    return(data)
+
 def subset_data(data, tmax = 405, dt = 0.4):
     """
     Subset data to tmax in timesteps of dt (both in kyr).
@@ -99,16 +227,605 @@ def subset_data(data, tmax = 405, dt = 0.4):
     # no subset
     if tmax == math.inf and dt == 0:
         return(data)
+    if len(data) < 2:
+        return(data)
     # in_sstep -73050 steps
     # dt = -2 days
     # thus dt (2*73050)/365.25 = 400 years per row in output
     years_per_row = abs(data[1][0] - data[0][0]) / 365.25
-    desired_row = tmax*1e3 / years_per_row
-    desired_res = dt*1e3 / years_per_row
-    # subset the data to the desired resolution
-    data = data[0:math.ceil(desired_row):int(desired_res)]
+    # subset the data to the desired resolution, with the same rows as the store
+    rows = subset_rows(len(data), years_per_row, tmax = tmax, dt = dt)
+    return(data[rows.start:rows.stop:rows.step])
+
+def subset_rows(nrows, years_per_row, tmin = 0, tmax = math.inf, dt = 0):
+    """
+    Row indices that subset_data (and read_store) keep, optionally starting at
+    tmin (kyr). A dt smaller than the spacing of the rows keeps every row.
+    """
+    assert tmax > 0, f"tmax must be greater than 0: {tmax}"
+    assert dt >= 0, f"dt must be greater than 0: {dt}"
+    if tmax == math.inf and dt == 0 and tmin == 0:
+        return(range(0, nrows))
+    stop = nrows if tmax == math.inf else min(nrows, math.ceil(tmax*1e3 / years_per_row))
+    step = max(1, int(dt*1e3 / years_per_row))
+    # start on the same grid as a subset from t = 0 so windows line up
+    start = math.ceil(tmin*1e3 / years_per_row / step) * step
+    return(range(start, stop, step))
+
+#######################################################################
+#             binary experiment store with a time index               #
+#######################################################################
+
+# the text output is converted once into a binary file next to it, with each
+# column compressed separately in chunks of chunk_rows rows. A json index
+# lists the chunks, their time range and where each column lives, so that
+# reading a time window only decompresses the chunks it needs.
+
+def get_store_files(filename, storedir = "orbitN-store"):
+    """
+    Paths of the binary store and its index for an orbitN output file
+    """
+    path, name = os.path.split(filename)
+    storepath = os.path.join(path, storedir)
+    return(os.path.join(storepath, name + ".bin"), os.path.join(storepath, name + ".json"))
+
+def source_signature(filename):
+    """
+    Size and modification time of a source file, to see whether it changed
+    """
+    stat = os.stat(filename)
+    return({"size": stat.st_size, "mtime_ns": stat.st_mtime_ns})
+
+def compress_column(column):
+    """
+    Compress a float column, shuffling the bytes so that exponents compress well
+    """
+    shuffled = column.view(np.uint8).reshape(-1, column.itemsize).T.copy()
+    return(zlib.compress(shuffled, 1))
+
+def decompress_column(buffer, dtype = np.float64):
+    """
+    Undo compress_column
+    """
+    itemsize = np.dtype(dtype).itemsize
+    shuffled = np.frombuffer(zlib.decompress(buffer), dtype = np.uint8)
+    return(shuffled.reshape(itemsize, -1).T.copy().view(dtype).ravel())
+
+def build_store(filename, data = None, chunk_rows = 2**16, storedir = "orbitN-store", tag = None):
+    """
+    Convert an orbitN output file into a chunked, compressed columnar store.
+    Pass data to store something derived from the file instead, with a tag
+    that describes how it was derived.
+    """
+    binfile, indexfile = get_store_files(filename, storedir)
+    os.makedirs(os.path.dirname(binfile), exist_ok = True)
+    signature = source_signature(filename)
+    if data is None:
+        data = get_data(filename)
+    data = np.asarray(data, dtype = np.float64)
+    nrows, ncols = data.shape
+    index = {"version": 1,
+             "source": os.path.basename(filename),
+             "signature": signature,
+             "tag": tag,
+             "nrows": nrows,
+             "ncols": ncols,
+             "chunk_rows": chunk_rows,
+             "years_per_row": abs(data[1, 0] - data[0, 0]) / 365.25 if nrows > 1 else 0,
+             "chunks": []}
+    offset = 0
+    with open(binfile + ".tmp", 'wb') as f:
+        for row in range(0, nrows, chunk_rows):
+            chunk = data[row:row + chunk_rows]
+            columns = []
+            for c in range(ncols):
+                buffer = compress_column(np.ascontiguousarray(chunk[:, c]))
+                f.write(buffer)
+                columns.append([offset, len(buffer)])
+                offset += len(buffer)
+            index["chunks"].append({"row": row, "nrows": len(chunk),
+                                    "tmin": chunk[0, 0], "tmax": chunk[-1, 0],
+                                    "columns": columns})
+    # write the index last, so an interrupted build is never seen as complete
+    os.replace(binfile + ".tmp", binfile)
+    with open(indexfile + ".tmp", 'w') as f:
+        json.dump(index, f)
+    os.replace(indexfile + ".tmp", indexfile)
+    return(index)
+
+def open_store(filename, storedir = "orbitN-store", convert = None, tag = None):
+    """
+    Return the index of the store for filename, (re)building it if the source
+    file changed size or modification time since it was built. To store
+    convert(data) instead of the data itself, give a tag that describes the
+    conversion, so that the store is rebuilt when it changes.
+    """
+    binfile, indexfile = get_store_files(filename, storedir)
+    try:
+        with open(indexfile) as f:
+            index = json.load(f)
+        if (index["signature"] == source_signature(filename) and index.get("tag") == tag
+                and os.path.exists(binfile)):
+            return(index)
+    except (OSError, ValueError, KeyError):
+        pass
+    data = None
+    if convert is not None:
+        data = convert(get_data(filename))
+    return(build_store(filename, data = data, storedir = storedir, tag = tag))
+
+def read_store(filename, tmin = 0, tmax = math.inf, dt = 0, columns = None, storedir = "orbitN-store",
+               convert = None, tag = None, dtype = np.float64):
+    """
+    Read rows in the window [tmin, tmax] (kyr) at stride dt (kyr) from the
+    store, only decompressing the chunks that hold them, into an array of
+    dtype with each column contiguous.
+    Gives the same rows as subset_data(get_data(filename), tmax, dt) for tmin = 0.
+    """
+    index = open_store(filename, storedir, convert = convert, tag = tag)
+    binfile, indexfile = get_store_files(filename, storedir)
+    columns = range(index["ncols"]) if columns is None else columns
+    rows = subset_rows(index["nrows"], index["years_per_row"], tmin, tmax, dt)
+    data = np.empty((len(rows), len(columns)), dtype = dtype, order = "F")
+    if len(rows) == 0:
+        return(data)
+    chunk_rows = index["chunk_rows"]
+    with open(binfile, 'rb') as f, mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mm:
+        out = 0
+        for chunk in index["chunks"][rows[0] // chunk_rows:rows[-1] // chunk_rows + 1]:
+            # the requested rows that fall within this chunk
+            first = max(rows.start, chunk["row"] + (rows.start - chunk["row"]) % rows.step)
+            local = range(first - chunk["row"], min(rows.stop, chunk["row"] + chunk["nrows"]) - chunk["row"], rows.step)
+            if len(local) == 0:
+                continue
+            for k, c in enumerate(columns):
+                offset, length = chunk["columns"][c]
+                data[out:out + len(local), k] = decompress_column(mm[offset:offset + length])[local.start:local.stop:local.step]
+            out += len(local)
     return(data)
 
+def convert_experiment(exp, outext = ".dat", chunk_rows = 2**16):
+    """
+    One-time conversion of all output files of an experiment into binary stores
+    """
+    path, inputfile, outputs = get_files(exp, outext = outext)
+    return([build_store(path + output, chunk_rows = chunk_rows) for output in outputs])
+
+def load_data(filename, tmax = math.inf, dt = 0, use_store = False, mu = None, dtype = np.float64):
+    """
+    Get the data subset to tmax in timesteps of dt as a Trajectory of dtype,
+    either by parsing the text output or from the binary store.
+    If mu is given, the (cartesian) file is converted to keplerian elements
+    for that gravitational parameter, see load_elements.
+    """
+    if mu is not None:
+        return(Trajectory.from_rows(load_elements(filename, mu, tmax = tmax, dt = dt, dtype = dtype)))
+    if use_store:
+        return(Trajectory.from_rows(read_store(filename, tmax = tmax, dt = dt, dtype = dtype)))
+    # parse straight into the columns, without a float64 copy of the file
+    data = Trajectory.from_rows(get_data_numpy(filename, dtype = dtype, order = "F"))
+    return(data.subset(tmax = tmax, dt = dt).compact())
+
+#######################################################################
+#            a trajectory as contiguous named column arrays           #
+#######################################################################
+
+# column names of the cartesian output, the elements are in element_columns
+cartesian_columns = ("t", "x", "y", "z", "vx", "vy", "vz")
+
+class Trajectory:
+    """
+    The rows of an output file stored column by column, so that each column
+    (t, x, y, z, vx, vy, vz or t, a, e, i, omega, Omega, varpi, anom) is one
+    contiguous array. Slicing rows or a time window gives a view on the same
+    memory. Indexing with [rows, columns] works like on the 2D array of rows,
+    and np.asarray gives that array (as a view), so the drawing functions take
+    a Trajectory or an array. load_data returns one.
+    """
+    def __init__(self, columns, names = None, years_per_row = None):
+        # columns is a (ncols, nrows) array, which is not copied
+        self.columns = columns
+        if names is None:
+            names = cartesian_columns if len(columns) == 7 else ("t",) + tuple(element_columns)
+        self.names = tuple(names)
+        if years_per_row is None:
+            years_per_row = abs(float(columns[0, 1]) - float(columns[0, 0])) / 365.25 if columns.shape[1] > 1 else 0
+        self.years_per_row = years_per_row
+
+    @classmethod
+    def from_rows(cls, data, names = None, dtype = None):
+        """
+        A 2D array of rows as a Trajectory, only copying it if its columns
+        aren't contiguous (or it isn't dtype yet)
+        """
+        data = np.asarray(data)
+        return(cls(np.ascontiguousarray(data.T, dtype = dtype), names))
+
+    @classmethod
+    def load(cls, filename, tmax = math.inf, dt = 0, dtype = np.float32, use_store = False, mu = None):
+        """
+        load_data, by default in 32 bit floats like blender
+        """
+        return(load_data(filename, tmax = tmax, dt = dt, use_store = use_store, mu = mu, dtype = dtype))
+
+    def __len__(self):
+        return(self.columns.shape[1])
+
+    @property
+    def shape(self):
+        return(self.columns.shape[::-1])
+
+    @property
+    def dtype(self):
+        return(self.columns.dtype)
+
+    def __array__(self, dtype = None, copy = None):
+        # the rows are a transposed view of the columns
+        rows = self.columns.T
+        if dtype is not None:
+            rows = rows.astype(dtype, copy = False)
+        return(rows.copy() if copy else rows)
+
+    def __getitem__(self, key):
+        """
+        A column by name, a view of a slice of rows, a single row, or
+        [rows, columns] as on the 2D array of rows (columns may be a name)
+        """
+        if isinstance(key, str):
+            return(self.columns[self.names.index(key)])
+        if isinstance(key, slice):
+            step = abs(key.step or 1)
+            return(Trajectory(self.columns[:, key], self.names, self.years_per_row * step))
+        if isinstance(key, tuple):
+            if len(key) != 2:
+                raise IndexError(f"a Trajectory has 2 dimensions, not {len(key)}")
+            rows, cols = key
+            if isinstance(cols, str):
+                cols = self.names.index(cols)
+            values = self.columns[cols, rows]
+            return(values.T if np.ndim(values) == 2 else values)
+        # rows by number, list, index or boolean array: the columns are the
+        # first axis here and the last one on the rows
+        return(np.moveaxis(self.columns[:, key], 0, -1))
+
+    def __iter__(self):
+        return(iter(self.columns.T))
+
+    def __repr__(self):
+        return(f"Trajectory({len(self)} rows of {', '.join(self.names)}, {self.columns.dtype})")
+
+    @property
+    def nbytes(self):
+        return(self.columns.nbytes)
+
+    def compact(self):
+        """
+        The same rows in memory of their own, e.g. to let go of the rest of the
+        file after taking a subset (no copy if it is already contiguous)
+        """
+        return(Trajectory(np.ascontiguousarray(self.columns), self.names, self.years_per_row))
+
+    def subset(self, tmax = math.inf, dt = 0, tmin = 0):
+        """
+        The rows that subset_data would keep, optionally from tmin (kyr), as a view
+        """
+        if len(self) < 2:
+            return(self)
+        rows = subset_rows(len(self), self.years_per_row, tmin = tmin, tmax = tmax, dt = dt)
+        return(self[rows.start:rows.stop:rows.step])
+
+    def window(self, tmin, tmax):
+        """
+        The rows between tmin and tmax (kyr), as a view
+        """
+        return(self.subset(tmin = tmin, tmax = tmax))
+
+#######################################################################
+#                 timing and memory instrumentation                   #
+#######################################################################
+
+# the report of the builder that is being instrumented, None when it's off
+instrumentation = None
+
+def peak_memory_mb():
+    """
+    Peak resident memory of this process so far in MB (None if unknown)
+    """
+    try:
+        import resource
+    except ImportError:
+        return(None)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux reports kB, macOS bytes
+    return(peak / 1024**2 if sys.platform == "darwin" else peak / 1024)
+
+def memory_mb():
+    """
+    Resident memory of this process right now in MB (None if unknown)
+    """
+    try:
+        with open("/proc/self/statm") as f:
+            return(int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1024**2)
+    except (OSError, ValueError, AttributeError):
+        pass
+    try:
+        import psutil
+    except ImportError:
+        return(None)
+    return(psutil.Process().memory_info().rss / 1024**2)
+
+def difference(after, before):
+    return(None if after is None or before is None else after - before)
+
+def show_progress(text):
+    """
+    Show what we're doing in the console and in Blender's status bar
+    """
+    print(f"[orbitN] {text}", flush = True)
+    if bpy is not None and getattr(bpy.context, "workspace", None) is not None:
+        bpy.context.workspace.status_text_set(text)
+
+@contextlib.contextmanager
+def timed_stage(name, planet = None, rows = None):
+    """
+    Record the wall time, rows and memory of a stage of a builder when
+    instrumentation is on: rss_mb is how much the resident memory grew during
+    the stage, and peak_rss_mb how far the stage pushed up the peak of the
+    process (0 when it stayed below an earlier peak). The stage can fill in
+    rows (or anything else) in the record it yields.
+    """
+    if instrumentation is None:
+        yield {}
+        return
+    record = {"stage": name, "planet": planet, "rows": rows}
+    if tracemalloc.is_tracing():
+        tracemalloc.reset_peak()
+    rss_start, peak_start = memory_mb(), peak_memory_mb()
+    start = time.perf_counter()
+    try:
+        yield record
+    finally:
+        record["seconds"] = time.perf_counter() - start
+        record["rss_mb"] = difference(memory_mb(), rss_start)
+        record["peak_rss_mb"] = difference(peak_memory_mb(), peak_start)
+        if tracemalloc.is_tracing():
+            record["peak_traced_mb"] = tracemalloc.get_traced_memory()[1] / 1024**2
+        instrumentation["stages"].append(record)
+        show_progress(f"{instrumentation['builder']}: {name}"
+                      + (f" {planet}" if planet is not None else "")
+                      + (f", {record['rows']} rows" if record["rows"] is not None else "")
+                      + f" in {record['seconds']:.2f} s")
+
+def write_report(report, path = None):
+    """
+    Print the time spent in each stage, and write the full report as json
+    """
+    totals = {}
+    for record in report["stages"]:
+        totals[record["stage"]] = totals.get(record["stage"], 0) + record["seconds"]
+    print(f"[orbitN] {report['builder']} took {report['seconds']:.2f} s, "
+          f"peak memory {report['peak_rss_mb'] or 0:.0f} MB")
+    for name, seconds in sorted(totals.items(), key = lambda item: -item[1]):
+        print(f"[orbitN] {name:>20}: {seconds:8.2f} s")
+    if isinstance(path, str):
+        with open(path, 'w') as f:
+            json.dump(report, f, indent = 2)
+
+def instrumented(builder):
+    """
+    Let a builder take report = True to time its stages and print a summary,
+    or report = "path.json" to also write the full report there. Use
+    trace_memory = True to also record the peak of python (and numpy)
+    allocations in each stage, which is slower.
+    """
+    @functools.wraps(builder)
+    def wrapper(*args, report = None, trace_memory = False, **kwargs):
+        global instrumentation
+        # builders called by an instrumented builder report to that one
+        if not report or instrumentation is not None:
+            return(builder(*args, **kwargs))
+        instrumentation = {"builder": builder.__name__,
+                           "args": [repr(arg) for arg in args],
+                           "kwargs": {key: repr(value) for key, value in kwargs.items()},
+                           "started": datetime.datetime.now().isoformat(timespec = "seconds"),
+                           "stages": []}
+        if trace_memory:
+            tracemalloc.start()
+        start = time.perf_counter()
+        try:
+            return(builder(*args, **kwargs))
+        finally:
+            result, instrumentation = instrumentation, None
+            result["seconds"] = time.perf_counter() - start
+            result["peak_rss_mb"] = peak_memory_mb()
+            if trace_memory:
+                tracemalloc.stop()
+            if bpy is not None and getattr(bpy.context, "workspace", None) is not None:
+                bpy.context.workspace.status_text_set(None)
+            write_report(result, report)
+    return(wrapper)
+
+#######################################################################
+#             load and preprocess planets in parallel                 #
+#######################################################################
+
+def preprocess_planet(filename, tmax = math.inf, dt = 0, use_store = False, ellipses = None, mu = None,
+                      dtype = np.float64):
+    """
+    Load and subset one output file, converting cartesian output to elements
+    if mu is given. If ellipses is a number of points, also calculate the
+    orbit ellipse of every row (of the elements).
+    Returns a dict with the data as a Trajectory of dtype and the ellipses as
+    a numpy array.
+    """
+    planet = os.path.basename(filename)
+    # the ellipses are calculated from 64 bit elements whatever dtype is
+    with timed_stage("load_data", planet) as record:
+        data = load_data(filename, tmax = tmax, dt = dt, use_store = use_store, mu = mu,
+                         dtype = np.float64 if ellipses is not None else dtype)
+        record["rows"] = len(data)
+    arrays = {}
+    if ellipses is not None:
+        with timed_stage("orbit_ellipses", planet, rows = len(data)):
+            arrays["points"] = orbit_ellipses(data[:, 1:6], N = ellipses)
+        data = Trajectory(data.columns.astype(dtype, copy = False), data.names, data.years_per_row)
+    arrays["data"] = data
+    return(arrays)
+
+def preprocess_planet_shared(*args, builder = None, trace_memory = False, **kwargs):
+    """
+    Run preprocess_planet in a worker process and move the results into shared
+    memory. Returns (name, shape, dtype) of each block, and the records of its
+    stages when builder (the name of the instrumented builder) is given.
+    """
+    global instrumentation
+    if builder is not None:
+        instrumentation = {"builder": builder, "stages": []}
+        if trace_memory:
+            tracemalloc.start()
+    handles = {}
+    try:
+        for key, array in preprocess_planet(*args, **kwargs).items():
+            # a trajectory travels as its columns, plus what it needs to be
+            # put back together
+            trajectory = None
+            if isinstance(array, Trajectory):
+                trajectory = {"names": array.names, "years_per_row": array.years_per_row}
+                array = array.columns
+            shm = shared_memory.SharedMemory(create = True, size = max(array.nbytes, 1))
+            handles[key] = (shm.name, array.shape, array.dtype.str, trajectory)
+            np.ndarray(array.shape, dtype = array.dtype, buffer = shm.buf)[...] = array
+            # the main process unlinks it once it's done with it
+            shm.close()
+    except BaseException:
+        unlink_shared(handles)
+        raise
+    finally:
+        stages, instrumentation = (instrumentation or {}).get("stages", []), None
+        if builder is not None and trace_memory:
+            tracemalloc.stop()
+    for record in stages:
+        record["worker"] = os.getpid()
+    return(handles, stages)
+
+def unlink_shared(handles):
+    """
+    Free the shared memory blocks of handles that were never attached
+    """
+    for name, shape, dtype, trajectory in handles.values():
+        try:
+            shm = shared_memory.SharedMemory(name = name)
+        except FileNotFoundError:
+            continue
+        shm.close()
+        shm.unlink()
+
+def attach_shared(handles):
+    """
+    Wrap the shared memory blocks from preprocess_planet_shared in numpy arrays
+    (and trajectories)
+    """
+    arrays = {"_shared": []}
+    for key, (name, shape, dtype, trajectory) in handles.items():
+        shm = shared_memory.SharedMemory(name = name)
+        arrays["_shared"].append(shm)
+        arrays[key] = np.ndarray(shape, dtype = dtype, buffer = shm.buf)
+        if trajectory is not None:
+            arrays[key] = Trajectory(arrays[key], **trajectory)
+    return(arrays)
+
+def release_shared(planets):
+    """
+    Free the shared memory behind the arrays returned by preprocess_planets
+    """
+    for arrays in planets:
+        blocks = arrays.pop("_shared", [])
+        arrays.clear()
+        for shm in blocks:
+            try:
+                shm.close()
+            except BufferError:
+                # someone still holds on to an array, the memory is freed
+                # once that goes away
+                pass
+            shm.unlink()
+
+def get_worker_module():
+    """
+    This file as a regular importable module, so that worker processes can
+    find the functions they run. Blender runs scripts from the text editor as
+    __main__, which the workers can't import.
+    """
+    if __name__ != "__main__":
+        return(sys.modules[__name__])
+    directory = os.path.dirname(os.path.abspath(__file__))
+    if directory not in sys.path:
+        sys.path.insert(0, directory)
+    return(importlib.import_module(os.path.splitext(os.path.basename(__file__))[0]))
+
+@contextlib.contextmanager
+def hide_main_file():
+    """
+    Spawned workers re-run the __main__ script if it has a file, which for a
+    script run inside blender means building the scene again. Hide it while
+    the workers start.
+    """
+    main = sys.modules["__main__"]
+    main_file = main.__dict__.pop("__file__", None)
+    try:
+        yield
+    finally:
+        if main_file is not None:
+            main.__file__ = main_file
+
+def preprocess_planets(filenames, tmax = math.inf, dt = 0, use_store = False, ellipses = None, workers = None,
+                       mus = None, dtype = np.float64):
+    """
+    Load, subset and (optionally) convert the output files concurrently in a
+    pool of worker processes (default: one per core, 1 runs everything in
+    this process). mus are the gravitational parameters to convert each
+    (cartesian) file to elements with, see load_elements.
+    Returns a list with a dict of numpy arrays for each file, in order, which
+    are backed by shared memory: call release_shared on the list when you are
+    done with them. Results don't depend on workers.
+    """
+    kwargs = dict(tmax = tmax, dt = dt, use_store = use_store, ellipses = ellipses, dtype = dtype)
+    mus = [None] * len(filenames) if mus is None else mus
+    workers = min(workers or os.cpu_count() or 1, len(filenames))
+    if workers <= 1:
+        return([preprocess_planet(filename, mu = mu, **kwargs) for filename, mu in zip(filenames, mus)])
+    module = get_worker_module()
+    context = multiprocessing.get_context("spawn")
+    if instrumentation is not None:
+        # let the workers time their stages too, we add them to the report
+        kwargs.update(builder = instrumentation["builder"], trace_memory = tracemalloc.is_tracing())
+    with timed_stage("preprocess_planets") as record:
+        with hide_main_file(), ProcessPoolExecutor(max_workers = workers, mp_context = context) as pool:
+            futures = [pool.submit(module.preprocess_planet_shared, filename, mu = mu, **kwargs)
+                       for filename, mu in zip(filenames, mus)]
+            planets = []
+            stages = []
+            try:
+                for future in futures:
+                    handles, worker_stages = future.result()
+                    planets.append(attach_shared(handles))
+                    stages.extend(worker_stages)
+            except BaseException:
+                # free what the other workers made before passing on the error
+                for future in futures:
+                    future.cancel()
+                wait(futures)
+                release_shared(planets)
+                for future in futures[len(planets):]:
+                    if not future.cancelled() and future.exception() is None:
+                        unlink_shared(future.result()[0])
+                raise
+        record["rows"] = sum(len(arrays["data"]) for arrays in planets)
+        record["workers"] = workers
+    if instrumentation is not None:
+        instrumentation["stages"].extend(stages)
+    return(planets)
+
 def get_planet_colors():
     # I got these by using the eydropper tool with a large radius on a picture of the planet
     # for the sun I made it a bit brighter.
@@ -139,6 +856,11 @@ def get_planet_radii():
 #               calculate/convert orbital parameters                  #
 #######################################################################
 
+# columns of the .elm.dat output, and how much to exaggerate each element on
+# the vertical axis of a time series
+element_columns = {"a": 1, "e": 2, "i": 3, "omega": 4, "Omega": 5, "varpi": 6, "anom": 7}
+element_scales = {"a": 1, "e": 10, "i": 10, "omega": 1, "Omega": 1, "varpi": 1, "anom": 1}
+
 def neworbit():
     """
     Create orbit with compatible units and anomaly type for default orbitN output
@@ -198,6 +920,167 @@ def orbit_points(orb, N = int(360/5)):
     orb.calculate_cartesian()
     return(orb)
 
+def solve_kepler(M, e, tol = 1e-14, maxiter = 50):
+    """
+    Solve Kepler's equation E - e sin(E) = M for the eccentric anomaly E, for
+    arrays of mean anomalies M and eccentricities e (radians) at once, using
+    Newton iteration
+    """
+    M = np.asarray(M)
+    e = np.asarray(e)
+    E = M + e * np.sin(M)
+    for _ in range(maxiter):
+        dE = (E - e * np.sin(E) - M) / (1 - e * np.cos(E))
+        E = E - dE
+        if np.all(np.abs(dE) < tol):
+            break
+    return(E)
+
+def rotate_orbital_plane(x, y, i, omega, Omega):
+    """
+    Rotate coordinates in the orbital plane (x pointing to the perihelion) to
+    the reference frame, given inclination i, argument of perihelion omega
+    and longitude of the ascending node Omega
+    """
+    cos_O, sin_O = np.cos(Omega), np.sin(Omega)
+    cos_o, sin_o = np.cos(omega), np.sin(omega)
+    cos_i, sin_i = np.cos(i), np.sin(i)
+    X = x * (cos_O * cos_o - sin_O * sin_o * cos_i) - y * (cos_O * sin_o + sin_O * cos_o * cos_i)
+    Y = x * (sin_O * cos_o + cos_O * sin_o * cos_i) + y * (cos_O * cos_o * cos_i - sin_O * sin_o)
+    Z = x * (sin_o * sin_i) + y * (cos_o * sin_i)
+    return(X, Y, Z)
+
+def orbit_ellipses(elements, N = int(360/5), dtype = np.float32, chunk_rows = 2**14):
+    """
+    Sample the ellipse of every row of keplerian elements (a, e, i, omega,
+    Omega, ...), such as orb.kepler.T or columns 1:6 of the .elm.dat output,
+    with N points equally spaced in mean anomaly (like orbit_points).
+    Returns xyz coordinates in AU in an array of shape (rows, N, 3).
+    """
+    elements = np.asarray(elements, dtype = np.float64)
+    points = np.empty((len(elements), N, 3), dtype = dtype)
+    M = np.linspace(0, math.tau, N)[None, :]
+    # work through the rows in chunks so the temporaries stay small
+    for start in range(0, len(elements), chunk_rows):
+        a, e, i, omega, Omega = (elements[start:start + chunk_rows, k, None] for k in range(5))
+        E = solve_kepler(M, e)
+        x = a * (np.cos(E) - e)
+        y = a * np.sqrt(1 - e**2) * np.sin(E)
+        X, Y, Z = rotate_orbital_plane(x, y, i, omega, Omega)
+        points[start:start + chunk_rows, :, 0] = X
+        points[start:start + chunk_rows, :, 1] = Y
+        points[start:start + chunk_rows, :, 2] = Z
+    return(points)
+
+def kepler_to_cartesian(elements, mu = None, dtype = np.float64, chunk_rows = 2**16):
+    """
+    Positions (AU) and velocities (AU/d) for rows of keplerian elements (a, e,
+    i, omega, Omega, mean anomaly) in the same order as orb.kepler, without
+    going through a pyorb Orbit. mu is the gravitational parameter in
+    AU^3/d^2, by default that of one solar mass like neworbit.
+    Rows are converted chunk_rows at a time so memory stays bounded. Relative
+    to the largest coordinate, the results agree with pyorb's
+    calculate_cartesian to within 5e-12 in float64 and 5e-6 in float32.
+    Returns two contiguous arrays of shape (rows, 3).
+    """
+    if mu is None:
+        mu = pyorb.get_G(length='AU', mass='Msol', time='d')
+    elements = np.asarray(elements)
+    pos = np.empty((len(elements), 3), dtype = dtype)
+    vel = np.empty((len(elements), 3), dtype = dtype)
+    tol = 8 * np.finfo(dtype).eps
+    for start in range(0, len(elements), chunk_rows):
+        stop = start + chunk_rows
+        a, e, i, omega, Omega, M = elements[start:stop, :6].astype(dtype, copy = False).T
+        E = solve_kepler(M, e, tol = tol)
+        cos_E, sin_E = np.cos(E), np.sin(E)
+        root = np.sqrt(1 - e**2)
+        # mean motion times a, divided by 1 - e cos(E) = r / a
+        speed = np.sqrt(mu / a) / (1 - e * cos_E)
+        pos[start:stop] = np.column_stack(rotate_orbital_plane(a * (cos_E - e), a * root * sin_E, i, omega, Omega))
+        vel[start:stop] = np.column_stack(rotate_orbital_plane(-speed * sin_E, speed * root * cos_E, i, omega, Omega))
+    return(pos, vel)
+
+def orbit_cartesian(data, mu = None, dtype = np.float64, chunk_rows = 2**16):
+    """
+    Positions and velocities for each row of .elm.dat output, see
+    kepler_to_cartesian
+    """
+    data = np.asarray(data)
+    columns = [element_columns[element] for element in ["a", "e", "i", "omega", "Omega", "anom"]]
+    return(kepler_to_cartesian(data[:, columns], mu = mu, dtype = dtype, chunk_rows = chunk_rows))
+
+def planet_mu(mass):
+    """
+    Gravitational parameter (AU^3/d^2) of the sun and a planet of mass
+    (relative to the sun, as returned by get_inp), for heliocentric elements
+    """
+    return(pyorb.get_G(length='AU', mass='Msol', time='d') * (1 + mass))
+
+def cartesian_to_kepler(data, mu, dtype = np.float64, chunk_rows = 2**16):
+    """
+    Keplerian elements for rows of cartesian output (t x y z vx vy vz), in
+    the columns of the .elm.dat output that xv2elm writes: t a e i omega
+    Omega varpi anom, with the angles in radians between -pi and pi (i
+    between 0 and pi) and the mean anomaly as anom. Rows at the origin, like
+    the sun's, get all zero elements.
+    """
+    data = np.asarray(data)
+    elements = np.empty((len(data), 8), dtype = dtype)
+    for start in range(0, len(data), chunk_rows):
+        chunk = data[start:start + chunk_rows].astype(dtype, copy = False)
+        r, v = chunk[:, 1:4], chunk[:, 4:7]
+        rnorm = np.linalg.norm(r, axis = 1)
+        vv = np.einsum('ij,ij->i', v, v)
+        rv = np.einsum('ij,ij->i', r, v)
+        h = np.cross(r, v)
+        hnorm = np.linalg.norm(h, axis = 1)
+        # no orbit to speak of, divide by 1 in stead of 0 and zero them below
+        origin = rnorm == 0
+        rnorm[origin] = 1
+        hnorm[hnorm == 0] = 1
+        # eccentricity vector, pointing to the perihelion
+        evec = ((vv - mu / rnorm)[:, None] * r - rv[:, None] * v) / mu
+        e = np.linalg.norm(evec, axis = 1)
+        a = 1 / (2 / rnorm - vv / mu)
+        i = np.arccos(np.clip(h[:, 2] / hnorm, -1, 1))
+        Omega = np.arctan2(h[:, 0], -h[:, 1])
+        # the ascending node, and the direction 90 degrees further in the orbit
+        node = np.column_stack([np.cos(Omega), np.sin(Omega), np.zeros_like(Omega)])
+        ahead = np.cross(h / hnorm[:, None], node)
+        omega = np.arctan2(np.einsum('ij,ij->i', evec, ahead), np.einsum('ij,ij->i', evec, node))
+        E = np.arctan2(rv / np.sqrt(mu * a), 1 - rnorm / a)
+        elements[start:start + chunk_rows, 0] = chunk[:, 0]
+        elements[start:start + chunk_rows, 1] = a
+        elements[start:start + chunk_rows, 2] = e
+        elements[start:start + chunk_rows, 3] = i
+        elements[start:start + chunk_rows, 4] = omega
+        elements[start:start + chunk_rows, 5] = Omega
+        elements[start:start + chunk_rows, 6] = np.mod(omega + Omega + math.pi, math.tau) - math.pi
+        elements[start:start + chunk_rows, 7] = E - e * np.sin(E)
+        elements[start:start + chunk_rows, 1:][origin] = 0
+    return(elements)
+
+def element_mus(outext, masses):
+    """
+    The gravitational parameters to convert the output of each body to
+    elements with, or None when the output (.elm.dat) already has elements
+    """
+    if outext.endswith(".elm.dat"):
+        return(None)
+    return([planet_mu(mass) for mass in masses])
+
+def load_elements(filename, mu, tmax = math.inf, dt = 0, dtype = np.float64):
+    """
+    Keplerian elements for a cartesian output file, subset to tmax in
+    timesteps of dt. The conversion runs once, after which the elements are
+    read from a store in the orbitN-elements subdirectory, until the
+    source file (or mu) changes.
+    """
+    return(read_store(filename, tmax = tmax, dt = dt, storedir = "orbitN-elements",
+                      convert = lambda data: cartesian_to_kepler(data, mu),
+                      tag = f"cartesian_to_kepler mu = {mu!r}", dtype = dtype))
+
 #######################################################################
 #               now do things in blender using the orbit data         #
 #######################################################################
@@ -212,9 +1095,105 @@ def make_collection(exp):
     scene.collection.children.link(collection)
     return(collection)
 
-def make_mesh(data, meshname, objname, color, material, collection, make_edges = False):
+def get_collection(exp, incremental = False):
+    """
+    Make a collection for exp, or with incremental = True reuse the one that
+    an earlier run made
+    """
+    collection = bpy.data.collections.get(exp) if incremental else None
+    if collection is None:
+        return(make_collection(exp))
+    scene = bpy.context.scene
+    if collection.name not in scene.collection.children:
+        scene.collection.children.link(collection)
+    return(collection)
+
+def build_hash(filename, **params):
+    """
+    Hash of the source file (size and modification time) and the parameters
+    that an object was built with. Numbers count as floats, so tmax = 405
+    and tmax = 405.0 are the same build.
+    """
+    params = {key: float(value) if isinstance(value, (int, float)) and not isinstance(value, bool) else value
+              for key, value in params.items()}
+    key = json.dumps([source_signature(filename), params], sort_keys = True, default = repr)
+    return(hashlib.sha1(key.encode()).hexdigest())
+
+def built_objects(collection, key):
+    """
+    Objects in collection that were built for key (e.g. "meshes:3")
+    """
+    return([obj for obj in collection.all_objects if obj.get("orbitN_key") == key])
+
+def is_built(collection, key, build):
+    """
+    Whether the objects for key are in collection and were built from the
+    same inputs
+    """
+    objs = built_objects(collection, key)
+    return(len(objs) > 0 and all(obj.get("orbitN_hash") == build for obj in objs))
+
+def tag_built(objs, key, build):
+    """
+    Remember what objs were built for and from which inputs
+    """
+    for obj in objs:
+        obj["orbitN_key"] = key
+        obj["orbitN_hash"] = build
+
+def remove_object(obj):
+    """
+    Remove an object, its children (e.g. the sphere of make_planet) and the
+    data and animation that nothing else uses
+    """
+    for child in obj.children:
+        remove_object(child)
+    data = obj.data
+    action = obj.animation_data.action if obj.animation_data else None
+    bpy.data.objects.remove(obj)
+    if isinstance(data, bpy.types.Mesh) and data.users == 0:
+        bpy.data.meshes.remove(data)
+    elif isinstance(data, bpy.types.GreasePencil) and data.users == 0:
+        bpy.data.grease_pencils.remove(data)
+    if action is not None and action.users == 0:
+        bpy.data.actions.remove(action)
+
+def remove_built(collection, key):
+    """
+    Remove the objects that an earlier run built for key, to rebuild them
+    """
+    for obj in built_objects(collection, key):
+        remove_object(obj)
+
+# the drawing functions ending in _steps are generators that yield between
+# small pieces of work, so that the import operator can spread a planet over
+# several timer events. run_steps runs one to the end in one go.
+frames_per_step = 32
+rows_per_step = 2**12
+
+def run_steps(steps):
+    """
+    Run a generator of drawing steps to the end, and return what it returns
+    """
+    while True:
+        try:
+            next(steps)
+        except StopIteration as stop:
+            return(stop.value)
+
+def make_mesh(data, meshname, objname, color, material, collection, make_edges = False, bulk = True):
     """
     Draw orbitN data as a mesh with vertices
+
+    With bulk = True the vertices, edges and attributes are filled from numpy
+    buffers in one call each, otherwise vertex by vertex.
+    """
+    return(run_steps(make_mesh_steps(data, meshname, objname, color, material, collection,
+                                     make_edges = make_edges, bulk = bulk)))
+
+def make_mesh_steps(data, meshname, objname, color, material, collection, make_edges = False, bulk = True):
+    """
+    The steps of make_mesh
     """
     # draw the orbits as vertices
     mesh = bpy.data.meshes.new(meshname)
@@ -239,8 +1218,14 @@ def make_mesh(data, meshname, objname, color, material, collection, make_edges =
     speed_u = mesh.attributes.new(name = "speed_u", type = "FLOAT", domain = "POINT")
     speed_v = mesh.attributes.new(name = "speed_v", type = "FLOAT", domain = "POINT")
     speed_w = mesh.attributes.new(name = "speed_w", type = "FLOAT", domain = "POINT")
+    yield
+    if bulk:
+        yield from fill_mesh_steps(mesh, data, make_edges = make_edges)
+        return(obj, mesh)
     # assign each vertex coordinate
     for i, point in enumerate(data):
+        if i % rows_per_step == 0:
+            yield
         # set the positions of the verts
         mesh.vertices[i].co = point[1:4]
         # set the vertex attributes
@@ -252,6 +1237,35 @@ def make_mesh(data, meshname, objname, color, material, collection, make_edges =
             mesh.edges[i-1].vertices = [i-1, i]
     return(obj, mesh)
 
+# columns of the cartesian output that end up as mesh attributes
+mesh_attributes = {"age": 0, "speed_u": 4, "speed_v": 5, "speed_w": 6}
+
+def fill_mesh(mesh, data, make_edges = False):
+    """
+    Set vertex positions, edges and attributes of a mesh that already has
+    len(data) vertices (and len(data) - 1 edges) using foreach_set
+    """
+    return(run_steps(fill_mesh_steps(mesh, data, make_edges = make_edges)))
+
+def fill_mesh_steps(mesh, data, make_edges = False):
+    """
+    The steps of fill_mesh, one foreach_set each
+    """
+    if len(data) == 0:
+        return(mesh)
+    data = np.asarray(data)
+    # blender stores all of these as 32 bit floats/ints
+    mesh.vertices.foreach_set("co", np.ascontiguousarray(data[:, 1:4], dtype = np.float32).ravel())
+    yield
+    if make_edges and len(data) > 1:
+        edges = np.arange(len(data), dtype = np.int32).repeat(2)[1:-1]
+        mesh.edges.foreach_set("vertices", edges)
+        yield
+    for name, col in mesh_attributes.items():
+        mesh.attributes[name].data.foreach_set("value", np.ascontiguousarray(data[:, col], dtype = np.float32))
+        yield
+    mesh.update()
+    return(mesh)
 
 def make_gpencil(data, gpname, objname, collection, matname, type = "orbit", cyclic = True):
     """
@@ -276,14 +1290,18 @@ def make_gpencil(data, gpname, objname, collection, matname, type = "orbit", cyc
     gp_stroke.end_cap_mode = 'FLAT'
     gp_stroke.use_cyclic = cyclic
     gp_stroke.points.add(len(data))
-    for i, point in enumerate(data):
-        if type == "orbit":
-            gp_stroke.points[i].co = data[i].cartesian[0:3]
-        elif type == "eccentricity":
-            # one blender unit is 1 kyr, and eccentricity is multiplied by 10
-            gp_stroke.points[i].co = [i*0.001, 0.0, data.e[i]*10]
-        elif type == "mesh":
-            gp_stroke.points[i].co = point[1:4]
+    if type == "points":
+        # an array of xyz coordinates, set all at once
+        gp_stroke.points.foreach_set("co", np.ascontiguousarray(data, dtype = np.float32).ravel())
+    else:
+        for i, point in enumerate(data):
+            if type == "orbit":
+                gp_stroke.points[i].co = data[i].cartesian[0:3]
+            elif type == "eccentricity":
+                # one blender unit is 1 kyr, and eccentricity is multiplied by 10
+                gp_stroke.points[i].co = [i*0.001, 0.0, data.e[i]*10]
+            elif type == "mesh":
+                gp_stroke.points[i].co = point[1:4]
     # find existing material in scene
     mat = bpy.data.materials[matname]
     gpencil_object.data.materials.append(mat)
@@ -312,11 +1330,27 @@ def make_planet(position, radius, emptyname, spherename, material, color, collec
     bpy.ops.object.shade_smooth()
     return empty
 
-def animate_planet(data, empty):
+def animate_planet(data, empty, bulk = True, interpolation = None):
     """
     Add keyframes to the sphere's location for each frame in the animation
+
+    With bulk = True the F-curves are baked directly from a numpy array, see
+    bake_location_keyframes.
     """
+    run_steps(animate_planet_steps(data, empty, bulk = bulk, interpolation = interpolation))
+
+def animate_planet_steps(data, empty, bulk = True, interpolation = None):
+    """
+    The steps of animate_planet
+    """
+    if bulk:
+        yield from location_keyframe_steps(empty, np.asarray(data)[:, 1:4], interpolation = interpolation)
+        # Set the end frame of the animation
+        bpy.context.scene.frame_end = len(data)
+        return
     for i in range(len(data)):
+        if i % rows_per_step == 0:
+            yield
         frame = i + 1
         time = data[i][0]
         loc = mathutils.Vector(data[i][1:4])
@@ -325,13 +1359,81 @@ def animate_planet(data, empty):
     # Set the end frame of the animation
     bpy.context.scene.frame_end = len(data)
 
-def make_meshes(exp, tmax = math.inf, dt = 0, outext = ".dat", make_planets = False, animate_planets = False):
+def keyframe_interpolation(interpolation = None):
+    """
+    The integer value of a keyframe interpolation (e.g. 'BEZIER', 'LINEAR')
+    that foreach_set wants, by default the user preference for new keyframes
+    (as with keyframe_insert)
+    """
+    if interpolation is None:
+        interpolation = bpy.context.preferences.edit.keyframe_new_interpolation_type
+    return(bpy.types.Keyframe.bl_rna.properties['interpolation'].enum_items[interpolation].value)
+
+def bake_location_keyframes(obj, locations, frame_start = 1, interpolation = None):
+    """
+    Create the location F-curves of obj with a keyframe for each row of xyz
+    locations, filling all keyframe points of a curve at once.
+    interpolation is e.g. 'BEZIER', 'LINEAR' or 'CONSTANT', by default the
+    user preference for new keyframes (as with keyframe_insert).
+    """
+    return(run_steps(location_keyframe_steps(obj, locations, frame_start = frame_start,
+                                             interpolation = interpolation)))
+
+def location_keyframe_steps(obj, locations, frame_start = 1, interpolation = None):
+    """
+    The steps of bake_location_keyframes, one F-curve each
+    """
+    locations = np.asarray(locations, dtype = np.float32).reshape(-1, 3)
+    nkeys = len(locations)
+    ipo = keyframe_interpolation(interpolation)
+    if obj.animation_data is None:
+        obj.animation_data_create()
+    action = obj.animation_data.action
+    if action is None:
+        action = bpy.data.actions.new(obj.name + "Action")
+        obj.animation_data.action = action
+    co = np.empty((nkeys, 2), dtype = np.float32)
+    co[:, 0] = np.arange(frame_start, frame_start + nkeys)
+    for axis in range(3):
+        # replace existing keyframes rather than adding to them
+        fcurve = action.fcurves.find("location", index = axis)
+        if fcurve is not None:
+            action.fcurves.remove(fcurve)
+        fcurve = action.fcurves.new("location", index = axis, action_group = "Object Transforms")
+        fcurve.keyframe_points.add(nkeys)
+        co[:, 1] = locations[:, axis]
+        fcurve.keyframe_points.foreach_set("co", co.ravel())
+        fcurve.keyframe_points.foreach_set("interpolation", np.full(nkeys, ipo, dtype = np.int32))
+        # sort and recalculate the handles
+        fcurve.update()
+        yield
+    if nkeys > 0:
+        obj.location = locations[0]
+    return(action)
+
+@instrumented
+def make_meshes(exp, tmax = math.inf, dt = 0, outext = ".dat", make_planets = False, animate_planets = False,
+                use_store = False, interpolation = None, workers = None, incremental = True, dtype = np.float32):
     """
     Takes an experiment folder in your default directory and draws
     a mesh with vertices for xyz locations and a planet at 1000x, potentially animating
     along the track.
+    The files are loaded in parallel by workers processes, and kept as dtype
+    (blender stores 32 bit floats anyway).
+    With incremental = True a re-run reuses the collection and only rebuilds
+    the planets whose file or parameters changed.
     """
-    collection = make_collection(exp)
+    run_plan(plan_meshes(exp, tmax = tmax, dt = dt, outext = outext, make_planets = make_planets,
+                         animate_planets = animate_planets, use_store = use_store,
+                         interpolation = interpolation, workers = workers, incremental = incremental,
+                         dtype = dtype))
+
+def plan_meshes(exp, tmax = math.inf, dt = 0, outext = ".dat", make_planets = False, animate_planets = False,
+                use_store = False, interpolation = None, workers = None, incremental = True, dtype = np.float32):
+    """
+    The steps of make_meshes, see run_plan
+    """
+    collection = get_collection(exp, incremental = incremental)
     path, inputfile, outputs = get_files(exp, outext = outext)
     names, masses, init_pos, init_velocity = get_inp(inputfile)
     # planet radii in AU
@@ -344,29 +1446,253 @@ def make_meshes(exp, tmax = math.inf, dt = 0, outext = ".dat", make_planets = Fa
     planet_mat = bpy.data.materials['Material']
     planet_colors = get_planet_colors()
 
-    for j in range(0, 10):
-        filename = path + outputs[j]
-        data = get_data(filename)
-        data = subset_data(data, tmax = tmax, dt = dt)
+    filenames = [path + output for output in outputs]
+    builds = [build_hash(filename, mode = "meshes", tmax = tmax, dt = dt, make_planets = make_planets,
+                         animate_planets = animate_planets, interpolation = interpolation,
+                         dtype = np.dtype(dtype).name)
+              for filename in filenames]
+    stale = [j for j in range(0, 10)
+             if not (incremental and is_built(collection, f"meshes:{j}", builds[j]))]
+
+    def load():
+        return(preprocess_planets([filenames[j] for j in stale], tmax = tmax, dt = dt,
+                                  use_store = use_store, workers = workers, dtype = dtype))
+
+    def draw(planet, j):
+        data = planet["data"]
+        remove_built(collection, f"meshes:{j}")
         # no need to subset modern
-        make_mesh(data, meshname = names[j], objname = str(j) + "_orbit_" + names[j], color = planet_colors[j],
-                  material = planet_mat, collection = collection, make_edges = False)
+        with timed_stage("make_mesh", names[j], rows = len(data)):
+            obj, mesh = yield from make_mesh_steps(data, meshname = names[j],
+                                                   objname = str(j) + "_orbit_" + names[j],
+                                                   color = planet_colors[j], material = planet_mat,
+                                                   collection = collection, make_edges = False)
+        built = [obj]
         if make_planets:
             # NOTE: planet bodies are not created within the collection somehow
-            plan = make_planet(position = data[0][1:4], # initial position
-                        radius = mult * radii_au[j],
-                        emptyname = str(j) + "_body_position_" + names[j],
-                        spherename = str(j) + "_body_sphere_" + names[j],
-                        material = planet_mat,
-                        color = planet_colors[j],
-                        collection = collection)
+            with timed_stage("make_planet", names[j]):
+                plan = make_planet(position = data[0][1:4], # initial position
+                            radius = mult * radii_au[j],
+                            emptyname = str(j) + "_body_position_" + names[j],
+                            spherename = str(j) + "_body_sphere_" + names[j],
+                            material = planet_mat,
+                            color = planet_colors[j],
+                            collection = collection)
+            built.append(plan)
+            yield
             if (animate_planets):
-                animate_planet(data, empty = plan)
+                with timed_stage("animate_planet", names[j], rows = len(data)):
+                    yield from animate_planet_steps(data, empty = plan, interpolation = interpolation)
+        tag_built(built, f"meshes:{j}", builds[j])
+
+    return({"names": names, "stale": stale, "load": load, "draw": draw})
+
+def run_plan(plan):
+    """
+    Run the steps of a builder: load the stale planets (which doesn't touch
+    bpy, so the import operator runs it in a thread), then draw them one by
+    one, and free the loaded data
+    """
+    planets = plan["load"]()
+    try:
+        for planet, j in zip(planets, plan["stale"]):
+            run_steps(draw_planet(plan, planet, j))
+    finally:
+        release_shared(planets)
+
+def draw_planet(plan, planet, j):
+    """
+    The steps of drawing planet j of a plan. Its objects are only tagged as
+    built once they are complete, and when the steps are stopped halfway
+    (cancelled, or an error) the objects made so far are removed again, so
+    the scene only has complete planets.
+    """
+    before = set(bpy.data.objects.keys())
+    try:
+        yield from plan["draw"](planet, j)
+    except BaseException:
+        for name in set(bpy.data.objects.keys()) - before:
+            # removing a parent removes its children too
+            obj = bpy.data.objects.get(name)
+            if obj is not None:
+                remove_object(obj)
+        raise
+
+@instrumented
+def make_binned_meshes(exp, bin_kyr = 100, window_kyr = 400, tmax = math.inf, dt = 0, outext = ".dat",
+                       unload = False, incremental = True):
+    """
+    Like make_meshes, but split each planet's trajectory into mesh objects of
+    bin_kyr each, in a collection per planet. The bins are read from the
+    binary store one at a time (see convert_experiment), so only one bin is
+    in memory while drawing.
+    While the animation plays only the bins within window_kyr before the
+    current frame are shown, by drivers on their visibility that are saved
+    with the file (so headless renders get it right too). With unload = True
+    the others are emptied too and read back from the store when they come
+    into view (see update_bins), which needs Auto Run Python Scripts when the
+    saved file is opened again (blender -y for renders).
+    """
+    if outext.endswith(".elm.dat"):
+        raise ValueError(f"make_binned_meshes draws positions from the cartesian output, not {outext}")
+    collection = get_collection(exp, incremental = incremental)
+    path, inputfile, outputs = get_files(exp, outext = outext)
+    names, masses, init_pos, init_velocity = get_inp(inputfile)
+    planet_mat = bpy.data.materials['Material']
+    planet_colors = get_planet_colors()
+    scene = bpy.context.scene
+    for j in range(0, 10):
+        filename = path + outputs[j]
+        key = f"binned_meshes:{j}"
+        build = build_hash(filename, mode = "binned_meshes", tmax = tmax, dt = dt, bin_kyr = bin_kyr,
+                           window_kyr = window_kyr, unload = unload)
+        index = open_store(filename)
+        # the frames of make_meshes are rows at the dt stride, which is a
+        # whole number of rows and so not always exactly dt
+        step = subset_rows(index["nrows"], index["years_per_row"], dt = dt).step
+        frame_kyr = step * index["years_per_row"] / 1e3
+        if incremental and is_built(collection, key, build):
+            continue
+        remove_built(collection, key)
+        name = str(j) + "_orbit_" + names[j]
+        planet_collection = collection.children.get(name)
+        if planet_collection is None:
+            planet_collection = bpy.data.collections.new(name)
+            collection.children.link(planet_collection)
+        end = min(tmax, index["nrows"] * index["years_per_row"] / 1e3)
+        bins = []
+        with timed_stage("make_bins", names[j]) as record:
+            for k in range(math.ceil(end / bin_kyr)):
+                obj, mesh = make_mesh(np.empty((0, 7)), meshname = f"{names[j]}_{k:04d}",
+                                      objname = f"{name}_{k:04d}", color = planet_colors[j],
+                                      material = planet_mat, collection = planet_collection)
+                obj["orbitN_source"] = filename
+                obj["orbitN_tmin"] = k * bin_kyr
+                obj["orbitN_tmax"] = min((k + 1) * bin_kyr, end)
+                obj["orbitN_dt"] = dt
+                obj["orbitN_unload"] = unload
+                add_bin_drivers(obj, frame_kyr, window_kyr)
+                if not unload:
+                    load_bin(obj)
+                bins.append(obj)
+            record["bins"] = len(bins)
+        tag_built(bins, key, build)
+    scene["orbitN_frame_kyr"] = frame_kyr
+    scene["orbitN_window_kyr"] = window_kyr
+    if unload:
+        add_bin_text()
+        register_bin_handler()
+        update_bins(scene)
+
+def add_bin_drivers(obj, frame_kyr, window_kyr):
+    """
+    Hide a bin unless it overlaps the window_kyr before the current frame.
+    The expression only uses frame and numbers, so blender evaluates it
+    without python, also when scripts aren't allowed to run.
+    """
+    t = f"(frame - 1) * {frame_kyr!r}"
+    expression = f"{t} < {obj['orbitN_tmin']!r} or {t} - {window_kyr!r} >= {obj['orbitN_tmax']!r}"
+    for prop in ("hide_viewport", "hide_render"):
+        driver = obj.driver_add(prop).driver
+        driver.type = 'SCRIPTED'
+        driver.expression = expression
+
+# registers update_bins when a file with unloaded bins is opened
+bin_text = """# made by make_binned_meshes: read bins back from the store when they come
+# into view, this needs Auto Run Python Scripts (or blender -y)
+import sys
+sys.path.insert(0, {directory!r})
+import visualise_orbitN
+visualise_orbitN.register_bin_handler()
+"""
+
+def add_bin_text(name = "orbitN_bins.py"):
+    """
+    A text block that blender runs as a module when the file is opened
+    """
+    text = bpy.data.texts.get(name) or bpy.data.texts.new(name)
+    text.from_string(bin_text.format(directory = os.path.dirname(os.path.abspath(__file__))))
+    text.use_module = True
+    return(text)
+
+def load_bin(obj):
+    """
+    Fill an empty bin mesh with its rows from the store
+    """
+    mesh = obj.data
+    if len(mesh.vertices) > 0:
+        return
+    data = read_store(obj["orbitN_source"], tmin = obj["orbitN_tmin"], tmax = obj["orbitN_tmax"],
+                      dt = obj["orbitN_dt"])
+    mesh.vertices.add(len(data))
+    # clear_geometry removes the attributes as well
+    for name in mesh_attributes:
+        if name not in mesh.attributes:
+            mesh.attributes.new(name = name, type = "FLOAT", domain = "POINT")
+    fill_mesh(mesh, data)
+
+def update_bins(scene, depsgraph = None):
+    """
+    frame_change_pre handler: fill the bins made with unload = True that
+    overlap the orbitN_window_kyr before the current frame, and empty the
+    others (their visibility follows from their drivers)
+    """
+    frame_kyr = scene.get("orbitN_frame_kyr")
+    window = scene.get("orbitN_window_kyr")
+    if not frame_kyr or not window:
+        return
+    t = (scene.frame_current - 1) * frame_kyr
+    for obj in scene.objects:
+        if "orbitN_tmin" not in obj or not obj.get("orbitN_unload"):
+            continue
+        if obj["orbitN_tmin"] <= t and obj["orbitN_tmax"] > t - window:
+            load_bin(obj)
+        elif len(obj.data.vertices) > 0:
+            obj.data.clear_geometry()
+
+if bpy is not None:
+    # keep unloading bins after opening another file in the same session
+    update_bins = bpy.app.handlers.persistent(update_bins)
+
+def register_bin_handler():
+    """
+    Run update_bins on every frame change, replacing the handler of an
+    earlier run of this script
+    """
+    handlers = bpy.app.handlers.frame_change_pre
+    for handler in [handler for handler in handlers if handler.__name__ == "update_bins"]:
+        handlers.remove(handler)
+    handlers.append(update_bins)
 
-def make_orbit_gpencil(data, gpname, objname, matname, collection, N = int(360/5)):
+def make_orbit_gpencil(data, gpname, objname, matname, collection, N = int(360/5), bulk = True, points = None):
     """
     Make a gpencil object with an ellipse, update every frame for each row in data
+
+    With bulk = True all ellipses are calculated at once with orbit_ellipses
+    (unless they are passed as points) and each stroke is filled in a single
+    call, otherwise through pyorb.
+    """
+    return(run_steps(make_orbit_gpencil_steps(data, gpname, objname, matname, collection, N = N,
+                                              bulk = bulk, points = points)))
+
+def make_orbit_gpencil_steps(data, gpname, objname, matname, collection, N = int(360/5), bulk = True,
+                             points = None):
+    """
+    The steps of make_orbit_gpencil, frames_per_step frames each
     """
+    if bulk:
+        if points is None:
+            points = orbit_ellipses(np.asarray(data)[:, 1:6], N = N)
+            yield
+        gpo, gpd, gp_layer, gp_frame, gp_stroke = make_gpencil(
+            data = points[0],
+            gpname = gpname,
+            objname = objname,
+            matname = matname,
+            collection = collection,
+            type = "points")
+        yield from animate_orbit_points_steps(points, gp_layer)
+        return(gpo)
     orb = assign_orbit_data(data)
     # make a gpencil and return the layer, frame, stroke
     gpo, gpd, gp_layer, gp_frame, gp_stroke = make_gpencil(
@@ -377,16 +1703,51 @@ def make_orbit_gpencil(data, gpname, objname, matname, collection, N = int(360/5
         collection = collection,
         type = "orbit")
     # animate the orbits for the remaining frames
-    animate_orbit(data, orb, gp_layer, gp_frame, gp_stroke)
+    yield from animate_orbit_steps(data, orb, gp_layer, gp_frame, gp_stroke, N = N)
+    return(gpo)
+
+def animate_orbit_points(points, gp_layer):
+    """
+    Assuming that frame 0 has the initial object, add a frame with one stroke
+    for each of the subsequent ellipses in points (frames x N x 3)
+    """
+    run_steps(animate_orbit_points_steps(points, gp_layer))
+
+def animate_orbit_points_steps(points, gp_layer):
+    """
+    The steps of animate_orbit_points
+    """
+    for f in range(1, len(points)):
+        if f % frames_per_step == 0:
+            yield
+        # Create a new frame and clear it
+        gp_frame = gp_layer.frames.new(f, active = True)
+        gp_frame.clear()
+        # Create a new stroke with the points
+        gp_stroke = gp_frame.strokes.new()
+        # Set the stroke properties
+        gp_stroke.line_width = 18
+        gp_stroke.use_cyclic = True
+        # set all the point positions at once
+        gp_stroke.points.add(count = points.shape[1])
+        gp_stroke.points.foreach_set("co", points[f].ravel())
 
 def animate_orbit(data, orb, gp_layer, gp_frame, gp_stroke, N = int(360/5)):
     """
     Assuming that frame 0 has the initial object, update it for the subsequent frames
     """
+    run_steps(animate_orbit_steps(data, orb, gp_layer, gp_frame, gp_stroke, N = N))
+
+def animate_orbit_steps(data, orb, gp_layer, gp_frame, gp_stroke, N = int(360/5)):
+    """
+    The steps of animate_orbit
+    """
     # animate it so we get some example orbits without duplicating the grease pencil object too much
     for f, dat in enumerate(data):
         if f == 0: # the first frame already exists
             continue
+        if f % frames_per_step == 0:
+            yield
         # calculate the xyz coords that trace the full orbit from kepler
         # add N new orbits where we only change the anomaly so we can plot it
         orbsmp_loop = orbit_points(orb[f], N = N)
@@ -403,56 +1764,1013 @@ def animate_orbit(data, orb, gp_layer, gp_frame, gp_stroke, N = int(360/5)):
         for i, value in enumerate(orbsmp_loop):
             gp_stroke.points[i].co = orbsmp_loop.cartesian[:,i][0:3]# assign xyz coords of orb to these and we're set!
 
-def make_animated_orbits(exp, tmax = 5, dt = .4, outext = ".elm.dat"):
+@instrumented
+def make_animated_orbits(exp, tmax = 5, dt = .4, outext = ".elm.dat", use_store = False, mode = "gpencil",
+                         N = int(360/5), workers = None, incremental = True, dtype = np.float32):
     """
     Takes an experiment folder in your default directory and
-    draws an ellipse in 3d space that animates over time
+    draws an ellipse in 3d space that animates over time.
+    With outext = ".dat" the elements are calculated from the cartesian
+    output (and cached), instead of read from xv2elm's .elm.dat output.
+
+    mode "gpencil" bakes the N points of every ellipse into a grease pencil
+    frame, mode "nodes" only stores the elements of every frame and lets a
+    geometry nodes tree draw the ellipse of the current frame.
+    The files are loaded and the ellipses calculated in parallel by workers
+    processes, the elements are kept as dtype.
+    With incremental = True a re-run reuses the collection and only rebuilds
+    the orbits whose file or parameters changed.
     """
-    collection = make_collection(exp)
+    run_plan(plan_animated_orbits(exp, tmax = tmax, dt = dt, outext = outext, use_store = use_store,
+                                  mode = mode, N = N, workers = workers, incremental = incremental,
+                                  dtype = dtype))
+
+def plan_animated_orbits(exp, tmax = 5, dt = .4, outext = ".elm.dat", use_store = False, mode = "gpencil",
+                         N = int(360/5), workers = None, incremental = True, dtype = np.float32):
+    """
+    The steps of make_animated_orbits, see run_plan
+    """
+    collection = get_collection(exp, incremental = incremental)
     path, inputfile, outputs = get_files(exp, outext = outext)
     names, masses, init_pos, init_velocity = get_inp(inputfile)
-    for j in range(1, 10):
-        filename = path + outputs[j]
-        data = get_data(filename)
-        data = subset_data(data, tmax, dt)
-        # create a gpencil that animates over frames
-        make_orbit_gpencil(data,
-            gpname = str(j) + "_gpencil_" + names[j],
-            objname = str(j) + "_orbit_" + names[j],
-            matname = str(j) + "_material_" + names[j] + "_MANUAL",
-            collection = collection)
+    if mode == "nodes":
+        tree = get_ellipse_node_group()
+    mus = element_mus(outext, masses)
+    builds = {j: build_hash(path + outputs[j], mode = mode, tmax = tmax, dt = dt, N = N, mu = mus and mus[j],
+                            dtype = np.dtype(dtype).name)
+              for j in range(1, 10)}
+    stale = [j for j in range(1, 10)
+             if not (incremental and is_built(collection, f"animated_orbits:{j}", builds[j]))]
+
+    def load():
+        return(preprocess_planets([path + outputs[j] for j in stale], tmax = tmax, dt = dt,
+                                  use_store = use_store, ellipses = None if mode == "nodes" else N,
+                                  workers = workers, mus = [mus[j] for j in stale] if mus else None,
+                                  dtype = dtype))
+
+    def draw(planet, j):
+        data = planet["data"]
+        remove_built(collection, f"animated_orbits:{j}")
+        yield
+        if mode == "nodes":
+            with timed_stage("make_orbit_nodes", names[j], rows = len(data)):
+                obj, mesh = make_orbit_nodes(data, tree,
+                    meshname = str(j) + "_elements_" + names[j],
+                    objname = str(j) + "_orbit_" + names[j],
+                    color = get_planet_colors()[j],
+                    material = bpy.data.materials['Material'],
+                    collection = collection, N = N)
+        else:
+            # create a gpencil that animates over frames
+            with timed_stage("make_orbit_gpencil", names[j], rows = len(data)):
+                obj = yield from make_orbit_gpencil_steps(data,
+                    gpname = str(j) + "_gpencil_" + names[j],
+                    objname = str(j) + "_orbit_" + names[j],
+                    matname = str(j) + "_material_" + names[j] + "_MANUAL",
+                    collection = collection, N = N, points = planet["points"])
+        tag_built([obj], f"animated_orbits:{j}", builds[j])
         # Set the end frame of the animation
         bpy.context.scene.frame_end = len(data)
 
-def make_eccentricity_curve(exp, tmax = 405, dt = 0.8, outext = ".elm.dat", make_planet = True):
+    return({"names": names, "stale": stale, "load": load, "draw": draw})
+
+#######################################################################
+#              procedural orbits using geometry nodes                 #
+#######################################################################
+
+# small helpers to build node trees, these work for the node group interface
+# of both blender 3.x and 4.x
+
+def new_node(tree, type, **props):
     """
-    Draw the Earth's eccentricity as a function of time
+    Add a node of type to tree and set its properties
     """
-    collection = make_collection(exp)
+    node = tree.nodes.new(type)
+    for key, value in props.items():
+        setattr(node, key, value)
+    return(node)
+
+def get_socket(sockets, name):
+    """
+    Find the enabled socket called name (some nodes have one per data type)
+    """
+    for socket in sockets:
+        if socket.name == name and socket.enabled:
+            return(socket)
+    raise KeyError(name)
+
+def connect(tree, value, socket):
+    """
+    Link an output socket to socket, or set its default value
+    """
+    if isinstance(value, bpy.types.NodeSocket):
+        tree.links.new(value, socket)
+    else:
+        socket.default_value = value
+    return(socket)
+
+def math_node(tree, operation, *values):
+    """
+    Add a math node that applies operation to values and return its output
+    """
+    node = new_node(tree, "ShaderNodeMath", operation = operation)
+    for socket, value in zip(node.inputs, values):
+        connect(tree, value, socket)
+    return(node.outputs[0])
+
+def new_group_socket(tree, in_out, name, socket_type, default = None):
+    """
+    Add an input or output socket to the interface of a node group
+    """
+    if hasattr(tree, "interface"):
+        socket = tree.interface.new_socket(name, in_out = in_out, socket_type = socket_type)
+    elif in_out == "INPUT":
+        socket = tree.inputs.new(socket_type, name)
+    else:
+        socket = tree.outputs.new(socket_type, name)
+    if default is not None:
+        socket.default_value = default
+    return(socket)
+
+def set_modifier_input(modifier, name, value):
+    """
+    Set the value of the node group input called name on a modifier
+    """
+    tree = modifier.node_group
+    if hasattr(tree, "interface"):
+        sockets = [item for item in tree.interface.items_tree
+                   if item.item_type == 'SOCKET' and item.in_out == 'INPUT']
+    else:
+        sockets = tree.inputs
+    identifier = [socket.identifier for socket in sockets if socket.name == name][0]
+    modifier[identifier] = value
+
+# the per-frame elements that the geometry nodes tree needs
+ellipse_elements = ["a", "e", "i", "omega", "Omega"]
+
+def get_ellipse_node_group(name = "orbitN_ellipse", kepler_iterations = 6):
+    """
+    Geometry nodes tree that replaces a point cloud of per-frame elements with
+    the orbit ellipse of the current frame, sampled equally spaced in mean
+    anomaly like orbit_points
+    """
+    if name in bpy.data.node_groups:
+        return(bpy.data.node_groups[name])
+    tree = bpy.data.node_groups.new(name, "GeometryNodeTree")
+    new_group_socket(tree, "INPUT", "Geometry", "NodeSocketGeometry")
+    new_group_socket(tree, "INPUT", "Points", "NodeSocketInt", default = int(360/5) - 1)
+    new_group_socket(tree, "INPUT", "Thickness", "NodeSocketFloat", default = 0.005)
+    new_group_socket(tree, "INPUT", "Material", "NodeSocketMaterial")
+    new_group_socket(tree, "OUTPUT", "Geometry", "NodeSocketGeometry")
+    group_in = new_node(tree, "NodeGroupInput")
+    group_out = new_node(tree, "NodeGroupOutput")
+    # the row of elements to use is the current frame
+    frame = get_socket(new_node(tree, "GeometryNodeInputSceneTime").outputs, "Frame")
+    elements = {}
+    for element in ellipse_elements:
+        attribute = new_node(tree, "GeometryNodeInputNamedAttribute", data_type = 'FLOAT')
+        get_socket(attribute.inputs, "Name").default_value = element
+        sample = new_node(tree, "GeometryNodeSampleIndex", data_type = 'FLOAT', domain = 'POINT', clamp = True)
+        connect(tree, get_socket(group_in.outputs, "Geometry"), get_socket(sample.inputs, "Geometry"))
+        connect(tree, get_socket(attribute.outputs, "Attribute"), get_socket(sample.inputs, "Value"))
+        connect(tree, frame, get_socket(sample.inputs, "Index"))
+        elements[element] = get_socket(sample.outputs, "Value")
+    a, e, i = elements["a"], elements["e"], elements["i"]
+    # a cyclic curve with one point per mean anomaly
+    circle = new_node(tree, "GeometryNodeCurvePrimitiveCircle", mode = 'RADIUS')
+    connect(tree, get_socket(group_in.outputs, "Points"), get_socket(circle.inputs, "Resolution"))
+    index = get_socket(new_node(tree, "GeometryNodeInputIndex").outputs, "Index")
+    M = math_node(tree, 'MULTIPLY', math_node(tree, 'DIVIDE', index, get_socket(group_in.outputs, "Points")), math.tau)
+    # solve Kepler's equation with a fixed number of Newton iterations
+    E = math_node(tree, 'ADD', M, math_node(tree, 'MULTIPLY', e, math_node(tree, 'SINE', M)))
+    for _ in range(kepler_iterations):
+        f = math_node(tree, 'SUBTRACT', math_node(tree, 'SUBTRACT', E, math_node(tree, 'MULTIPLY', e, math_node(tree, 'SINE', E))), M)
+        df = math_node(tree, 'SUBTRACT', 1.0, math_node(tree, 'MULTIPLY', e, math_node(tree, 'COSINE', E)))
+        E = math_node(tree, 'SUBTRACT', E, math_node(tree, 'DIVIDE', f, df))
+    # position in the orbital plane
+    x = math_node(tree, 'MULTIPLY', a, math_node(tree, 'SUBTRACT', math_node(tree, 'COSINE', E), e))
+    b = math_node(tree, 'MULTIPLY', a, math_node(tree, 'SQRT', math_node(tree, 'SUBTRACT', 1.0, math_node(tree, 'MULTIPLY', e, e))))
+    y = math_node(tree, 'MULTIPLY', b, math_node(tree, 'SINE', E))
+    xyz = new_node(tree, "ShaderNodeCombineXYZ")
+    connect(tree, x, xyz.inputs["X"])
+    connect(tree, y, xyz.inputs["Y"])
+    position = xyz.outputs["Vector"]
+    # rotate by omega around z, i around x and Omega around z again
+    for axis, angle in (('Z_AXIS', elements["omega"]), ('X_AXIS', i), ('Z_AXIS', elements["Omega"])):
+        rotate = new_node(tree, "ShaderNodeVectorRotate", rotation_type = axis)
+        connect(tree, position, rotate.inputs["Vector"])
+        connect(tree, angle, rotate.inputs["Angle"])
+        position = rotate.outputs["Vector"]
+    set_position = new_node(tree, "GeometryNodeSetPosition")
+    connect(tree, circle.outputs["Curve"], get_socket(set_position.inputs, "Geometry"))
+    connect(tree, position, get_socket(set_position.inputs, "Position"))
+    # give the curve some thickness so that it renders
+    profile = new_node(tree, "GeometryNodeCurvePrimitiveCircle", mode = 'RADIUS')
+    get_socket(profile.inputs, "Resolution").default_value = 8
+    connect(tree, get_socket(group_in.outputs, "Thickness"), get_socket(profile.inputs, "Radius"))
+    to_mesh = new_node(tree, "GeometryNodeCurveToMesh")
+    connect(tree, get_socket(set_position.outputs, "Geometry"), get_socket(to_mesh.inputs, "Curve"))
+    connect(tree, profile.outputs["Curve"], get_socket(to_mesh.inputs, "Profile Curve"))
+    set_material = new_node(tree, "GeometryNodeSetMaterial")
+    connect(tree, get_socket(to_mesh.outputs, "Mesh"), get_socket(set_material.inputs, "Geometry"))
+    connect(tree, get_socket(group_in.outputs, "Material"), get_socket(set_material.inputs, "Material"))
+    connect(tree, get_socket(set_material.outputs, "Geometry"), get_socket(group_out.inputs, "Geometry"))
+    return(tree)
+
+def make_orbit_nodes(data, tree, meshname, objname, color, material, collection, N = int(360/5),
+                     thickness = 0.005):
+    """
+    Store the keplerian elements of every row in data as attributes of one
+    point per frame, and draw the ellipse of the current frame with the
+    geometry nodes tree from get_ellipse_node_group
+    """
+    data = np.asarray(data)
+    mesh = bpy.data.meshes.new(meshname)
+    obj = bpy.data.objects.new(objname, mesh)
+    obj.color = color
+    collection.objects.link(obj)
+    mesh.vertices.add(len(data))
+    for element in ellipse_elements:
+        attribute = mesh.attributes.new(name = element, type = "FLOAT", domain = "POINT")
+        attribute.data.foreach_set("value", np.ascontiguousarray(data[:, element_columns[element]], dtype = np.float32))
+    mesh.update()
+    modifier = obj.modifiers.new("orbitN ellipse", "NODES")
+    modifier.node_group = tree
+    # orbit_points' N points include both ends, which coincide
+    set_modifier_input(modifier, "Points", N - 1)
+    set_modifier_input(modifier, "Thickness", thickness)
+    set_modifier_input(modifier, "Material", material)
+    return(obj, mesh)
+
+def get_trail_node_group(name = "orbitN_trail"):
+    """
+    Geometry nodes tree that only keeps the last Trail kyr of a mesh made by
+    make_mesh (with edges) up to the row of the current frame, as a tube, and
+    puts a sphere on the row of the current frame
+    """
+    if name in bpy.data.node_groups:
+        return(bpy.data.node_groups[name])
+    tree = bpy.data.node_groups.new(name, "GeometryNodeTree")
+    new_group_socket(tree, "INPUT", "Geometry", "NodeSocketGeometry")
+    new_group_socket(tree, "INPUT", "Trail", "NodeSocketFloat", default = 10.0)
+    new_group_socket(tree, "INPUT", "Thickness", "NodeSocketFloat", default = 0.005)
+    new_group_socket(tree, "INPUT", "Material", "NodeSocketMaterial")
+    new_group_socket(tree, "INPUT", "Planet Radius", "NodeSocketFloat", default = 0.0)
+    new_group_socket(tree, "INPUT", "Planet Material", "NodeSocketMaterial")
+    new_group_socket(tree, "OUTPUT", "Geometry", "NodeSocketGeometry")
+    group_in = new_node(tree, "NodeGroupInput")
+    group_out = new_node(tree, "NodeGroupOutput")
+    geometry = get_socket(group_in.outputs, "Geometry")
+    # frame 1 is the first row, like animate_planet
+    frame = get_socket(new_node(tree, "GeometryNodeInputSceneTime").outputs, "Frame")
+    head = math_node(tree, 'SUBTRACT', frame, 1.0)
+    index = get_socket(new_node(tree, "GeometryNodeInputIndex").outputs, "Index")
+    # the age (time in days) of every row, and of the row of this frame
+    attribute = new_node(tree, "GeometryNodeInputNamedAttribute", data_type = 'FLOAT')
+    get_socket(attribute.inputs, "Name").default_value = "age"
+    age = get_socket(attribute.outputs, "Attribute")
+    sample = new_node(tree, "GeometryNodeSampleIndex", data_type = 'FLOAT', domain = 'POINT', clamp = True)
+    connect(tree, geometry, get_socket(sample.inputs, "Geometry"))
+    connect(tree, age, get_socket(sample.inputs, "Value"))
+    connect(tree, head, get_socket(sample.inputs, "Index"))
+    age_now = get_socket(sample.outputs, "Value")
+    # keep the rows up to this frame that are less than Trail kyr older
+    trail_days = math_node(tree, 'MULTIPLY', get_socket(group_in.outputs, "Trail"), 365.25e3)
+    recent = math_node(tree, 'LESS_THAN', math_node(tree, 'ABSOLUTE', math_node(tree, 'SUBTRACT', age, age_now)),
+                       trail_days)
+    past = math_node(tree, 'LESS_THAN', index, math_node(tree, 'ADD', head, 0.5))
+    delete = new_node(tree, "GeometryNodeDeleteGeometry", domain = 'POINT')
+    connect(tree, geometry, get_socket(delete.inputs, "Geometry"))
+    connect(tree, math_node(tree, 'LESS_THAN', math_node(tree, 'MULTIPLY', recent, past), 0.5),
+            get_socket(delete.inputs, "Selection"))
+    # give the trail some thickness so that it renders
+    to_curve = new_node(tree, "GeometryNodeMeshToCurve")
+    connect(tree, get_socket(delete.outputs, "Geometry"), get_socket(to_curve.inputs, "Mesh"))
+    profile = new_node(tree, "GeometryNodeCurvePrimitiveCircle", mode = 'RADIUS')
+    get_socket(profile.inputs, "Resolution").default_value = 8
+    connect(tree, get_socket(group_in.outputs, "Thickness"), get_socket(profile.inputs, "Radius"))
+    to_mesh = new_node(tree, "GeometryNodeCurveToMesh")
+    connect(tree, get_socket(to_curve.outputs, "Curve"), get_socket(to_mesh.inputs, "Curve"))
+    connect(tree, profile.outputs["Curve"], get_socket(to_mesh.inputs, "Profile Curve"))
+    trail = new_node(tree, "GeometryNodeSetMaterial")
+    connect(tree, get_socket(to_mesh.outputs, "Mesh"), get_socket(trail.inputs, "Geometry"))
+    connect(tree, get_socket(group_in.outputs, "Material"), get_socket(trail.inputs, "Material"))
+    # a sphere at the position of this frame, instead of keyframes
+    position = new_node(tree, "GeometryNodeSampleIndex", data_type = 'FLOAT_VECTOR', domain = 'POINT', clamp = True)
+    connect(tree, geometry, get_socket(position.inputs, "Geometry"))
+    connect(tree, get_socket(new_node(tree, "GeometryNodeInputPosition").outputs, "Position"),
+            get_socket(position.inputs, "Value"))
+    connect(tree, head, get_socket(position.inputs, "Index"))
+    point = new_node(tree, "GeometryNodePoints")
+    get_socket(point.inputs, "Count").default_value = 1
+    connect(tree, get_socket(position.outputs, "Value"), get_socket(point.inputs, "Position"))
+    sphere = new_node(tree, "GeometryNodeMeshUVSphere")
+    connect(tree, get_socket(group_in.outputs, "Planet Radius"), get_socket(sphere.inputs, "Radius"))
+    sphere_material = new_node(tree, "GeometryNodeSetMaterial")
+    connect(tree, get_socket(sphere.outputs, "Mesh"), get_socket(sphere_material.inputs, "Geometry"))
+    connect(tree, get_socket(group_in.outputs, "Planet Material"), get_socket(sphere_material.inputs, "Material"))
+    instance = new_node(tree, "GeometryNodeInstanceOnPoints")
+    connect(tree, point.outputs[0], get_socket(instance.inputs, "Points"))
+    connect(tree, get_socket(sphere_material.outputs, "Geometry"), get_socket(instance.inputs, "Instance"))
+    join = new_node(tree, "GeometryNodeJoinGeometry")
+    connect(tree, get_socket(trail.outputs, "Geometry"), get_socket(join.inputs, "Geometry"))
+    connect(tree, get_socket(instance.outputs, "Instances"), get_socket(join.inputs, "Geometry"))
+    connect(tree, get_socket(join.outputs, "Geometry"), get_socket(group_out.inputs, "Geometry"))
+    return(tree)
+
+def make_trail(data, tree, meshname, objname, color, material, collection, trail_kyr = 10,
+               thickness = 0.005, planet_radius = 0.0, planet_material = None):
+    """
+    Draw a planet's positions once, as a mesh with edges and the age
+    attribute, and let the trail geometry nodes tree show the last trail_kyr
+    of it up to the current frame, with a sphere of planet_radius (if > 0)
+    at the head
+    """
+    return(run_steps(make_trail_steps(data, tree, meshname, objname, color, material, collection,
+                                      trail_kyr = trail_kyr, thickness = thickness,
+                                      planet_radius = planet_radius, planet_material = planet_material)))
+
+def make_trail_steps(data, tree, meshname, objname, color, material, collection, trail_kyr = 10,
+                     thickness = 0.005, planet_radius = 0.0, planet_material = None):
+    """
+    The steps of make_trail
+    """
+    obj, mesh = yield from make_mesh_steps(data, meshname = meshname, objname = objname, color = color,
+                                           material = material, collection = collection, make_edges = True)
+    modifier = obj.modifiers.new("orbitN trail", "NODES")
+    modifier.node_group = tree
+    set_modifier_input(modifier, "Trail", trail_kyr)
+    set_modifier_input(modifier, "Thickness", thickness)
+    set_modifier_input(modifier, "Material", material)
+    set_modifier_input(modifier, "Planet Radius", planet_radius)
+    set_modifier_input(modifier, "Planet Material", planet_material or material)
+    return(obj, mesh)
+
+@instrumented
+def make_trails(exp, trail_kyr = 10, tmax = math.inf, dt = 0, outext = ".dat", make_planets = True,
+                thickness = 0.005, use_store = False, workers = None, incremental = True, dtype = np.float32):
+    """
+    Draw each planet with a trail of its last trail_kyr that moves along with
+    the animation (one row per frame). Every position is stored once, in a
+    mesh per planet, and a geometry nodes tree picks the trail and places
+    the planet for the current frame, so nothing is baked per frame.
+    """
+    run_plan(plan_trails(exp, trail_kyr = trail_kyr, tmax = tmax, dt = dt, outext = outext,
+                         make_planets = make_planets, thickness = thickness, use_store = use_store,
+                         workers = workers, incremental = incremental, dtype = dtype))
+
+def plan_trails(exp, trail_kyr = 10, tmax = math.inf, dt = 0, outext = ".dat", make_planets = True,
+                thickness = 0.005, use_store = False, workers = None, incremental = True, dtype = np.float32):
+    """
+    The steps of make_trails, see run_plan
+    """
+    collection = get_collection(exp, incremental = incremental)
+    path, inputfile, outputs = get_files(exp, outext = outext)
+    names, masses, init_pos, init_velocity = get_inp(inputfile)
+    radii_au = get_planet_radii()
+    planet_mat = bpy.data.materials['Material']
+    planet_colors = get_planet_colors()
+    tree = get_trail_node_group()
+    filenames = [path + output for output in outputs]
+    builds = [build_hash(filename, mode = "trails", tmax = tmax, dt = dt, trail_kyr = trail_kyr,
+                         make_planets = make_planets, thickness = thickness, dtype = np.dtype(dtype).name)
+              for filename in filenames]
+    stale = [j for j in range(0, 10)
+             if not (incremental and is_built(collection, f"trails:{j}", builds[j]))]
+
+    def load():
+        return(preprocess_planets([filenames[j] for j in stale], tmax = tmax, dt = dt,
+                                  use_store = use_store, workers = workers, dtype = dtype))
+
+    def draw(planet, j):
+        data = planet["data"]
+        remove_built(collection, f"trails:{j}")
+        with timed_stage("make_trail", names[j], rows = len(data)):
+            obj, mesh = yield from make_trail_steps(
+                data, tree, meshname = str(j) + "_trail_" + names[j],
+                objname = str(j) + "_trail_" + names[j], color = planet_colors[j],
+                material = planet_mat, collection = collection, trail_kyr = trail_kyr,
+                thickness = thickness,
+                planet_radius = 1e3 * radii_au[j] if make_planets else 0.0)
+        tag_built([obj], f"trails:{j}", builds[j])
+        # Set the end frame of the animation
+        bpy.context.scene.frame_end = len(data)
+
+    return({"names": names, "stale": stale, "load": load, "draw": draw})
+
+@instrumented
+def make_eccentricity_curve(exp, tmax = 405, dt = 0.8, outext = ".elm.dat", make_planet = True,
+                            use_store = False, incremental = True):
+    """
+    Draw the Earth's eccentricity as a function of time. With outext = ".dat"
+    it is calculated from the cartesian output.
+    With incremental = True a re-run with the same file and parameters
+    doesn't redraw it.
+    """
+    run_plan(plan_eccentricity_curve(exp, tmax = tmax, dt = dt, outext = outext, make_planet = make_planet,
+                                     use_store = use_store, incremental = incremental))
+
+def plan_eccentricity_curve(exp, tmax = 405, dt = 0.8, outext = ".elm.dat", make_planet = True,
+                            use_store = False, incremental = True, workers = 1):
+    """
+    The steps of make_eccentricity_curve, see run_plan
+    """
+    collection = get_collection(exp, incremental = incremental)
     path, inputfile, outputs = get_files(exp, outext = outext)
     names, masses, init_pos, init_velocity = get_inp(inputfile)
     j = 3 # just for the Earth
     filename = path + outputs[j]
-    data = get_data(filename)
-    data = subset_data(data, tmax = tmax, dt = dt)
-    orb = assign_orbit_data(data)
-    make_gpencil(orb,
-                 gpname = str(j) + "_gpencil_" + names[j],
-                 objname = str(j) + "_orbit_" + names[j],
-                 matname = str(j) + "_material_" + names[j] + "_MANUAL",
-                 collection = collection, type = "eccentricity", cyclic = False)
-    if make_planet:
-        ecc = make_planet(position = [0*0.001, 0.0, orb.e[0]*10],
-                          radius = 1e3 * get_planet_radii()[j],
-                          emptyname = str(j) + "_eccentricity_" + names[j],
-                          spherename = str(j) + "_ecc_body_" + names[j],
-                          material = bpy.data.materials['Material'],
-                          color = get_planet_colors()[j],
-                          collection = collection)
-        planet_pos = []
-        for i, o in enumerate(orb.e):
-            planet_pos.append([0.0, i * 0.001, 0.0, orb.e[i]*10])
-            animate_planet(planet_pos, ecc)
+    mus = element_mus(outext, masses)
+    key = f"eccentricity:{j}"
+    build = build_hash(filename, mode = "eccentricity", tmax = tmax, dt = dt, make_planet = make_planet,
+                       mu = mus and mus[j])
+    stale = [] if incremental and is_built(collection, key, build) else [j]
+
+    def load():
+        return(preprocess_planets([filename for j in stale], tmax = tmax, dt = dt, use_store = use_store,
+                                  workers = workers, mus = [mus[j] for j in stale] if mus else None))
+
+    def draw(planet, j):
+        data = planet["data"]
+        remove_built(collection, key)
+        yield
+        with timed_stage("draw_element_curve", names[j], rows = len(data)):
+            built = yield from draw_element_curve_steps(element_curve_points(data, "e"), j,
+                               gpname = str(j) + "_gpencil_" + names[j],
+                               objname = str(j) + "_orbit_" + names[j],
+                               matname = str(j) + "_material_" + names[j] + "_MANUAL",
+                               emptyname = str(j) + "_eccentricity_" + names[j],
+                               spherename = str(j) + "_ecc_body_" + names[j],
+                               collection = collection, with_planet = make_planet)
+        tag_built(built, key, build)
+
+    return({"names": names, "stale": stale, "load": load, "draw": draw})
+
+def element_curve_points(data, element = "e", scale = None, offset = 0.0):
+    """
+    xyz coordinates of a time series of an orbital element: one blender unit on
+    x for every 1000 rows, offset on y, and the scaled element on z
+    """
+    values = np.asarray(data)[:, element_columns[element]]
+    scale = element_scales[element] if scale is None else scale
+    points = np.empty((len(values), 3))
+    points[:, 0] = np.arange(len(values)) * 0.001
+    points[:, 1] = offset
+    points[:, 2] = values * scale
+    return(points)
+
+def draw_element_curve(points, j, gpname, objname, matname, emptyname, spherename, collection,
+                       with_planet = True, interpolation = None):
+    """
+    Draw a time series as a grease pencil stroke, and optionally a planet
+    that moves along it with one keyframe per point. Returns the objects.
+    """
+    return(run_steps(draw_element_curve_steps(points, j, gpname, objname, matname, emptyname, spherename,
+                                              collection, with_planet = with_planet,
+                                              interpolation = interpolation)))
+
+def draw_element_curve_steps(points, j, gpname, objname, matname, emptyname, spherename, collection,
+                             with_planet = True, interpolation = None):
+    """
+    The steps of draw_element_curve
+    """
+    gpo, gpd, gp_layer, gp_frame, gp_stroke = make_gpencil(points, gpname = gpname, objname = objname,
+                                                           matname = matname, collection = collection,
+                                                           type = "points", cyclic = False)
+    yield
+    if not with_planet:
+        return([gpo])
+    planet = make_planet(position = points[0],
+                         radius = 1e3 * get_planet_radii()[j],
+                         emptyname = emptyname,
+                         spherename = spherename,
+                         material = bpy.data.materials['Material'],
+                         color = get_planet_colors()[j],
+                         collection = collection)
+    yield
+    yield from location_keyframe_steps(planet, points, interpolation = interpolation)
+    # Set the end frame of the animation
+    bpy.context.scene.frame_end = len(points)
+    return([gpo, planet])
+
+@instrumented
+def make_element_curves(exp, elements = ("e",), planets = (3,), tmax = 405, dt = 0.8, outext = ".elm.dat",
+                        make_planets = True, use_store = False, spacing = 0.5, incremental = True):
+    """
+    Draw time series of orbital elements (a, e, i, omega, Omega, varpi) for
+    each of the planets (0 Sun ... 9 Pluto), each with a planet that moves
+    along it with time. Consecutive curves are spaced along y.
+    With outext = ".dat" the elements are calculated from the cartesian output.
+    With incremental = True a re-run only redraws the curves whose file or
+    parameters changed.
+    """
+    run_plan(plan_element_curves(exp, elements = elements, planets = planets, tmax = tmax, dt = dt,
+                                 outext = outext, make_planets = make_planets, use_store = use_store,
+                                 spacing = spacing, incremental = incremental))
+
+def plan_element_curves(exp, elements = ("e",), planets = (3,), tmax = 405, dt = 0.8, outext = ".elm.dat",
+                        make_planets = True, use_store = False, spacing = 0.5, incremental = True, workers = 1):
+    """
+    The steps of make_element_curves, see run_plan. A planet is stale when
+    any of its curves is, and only those curves are drawn again.
+    """
+    collection = get_collection(exp, incremental = incremental)
+    path, inputfile, outputs = get_files(exp, outext = outext)
+    names, masses, init_pos, init_velocity = get_inp(inputfile)
+    mus = element_mus(outext, masses)
+    # the curves to draw for each planet: element, offset, key and build
+    curves = {}
+    k = 0
+    for j in planets:
+        for element in elements:
+            offset = k * spacing
+            k += 1
+            key = f"element_curves:{j}:{element}"
+            build = build_hash(path + outputs[j], mode = "element_curves", tmax = tmax, dt = dt, offset = offset,
+                               make_planet = make_planets, mu = mus and mus[j])
+            if not (incremental and is_built(collection, key, build)):
+                curves.setdefault(j, []).append((element, offset, key, build))
+    stale = list(curves)
+
+    def load():
+        return(preprocess_planets([path + outputs[j] for j in stale], tmax = tmax, dt = dt,
+                                  use_store = use_store, workers = workers,
+                                  mus = [mus[j] for j in stale] if mus else None))
+
+    def draw(planet, j):
+        data = planet["data"]
+        for element, offset, key, build in curves[j]:
+            remove_built(collection, key)
+            yield
+            points = element_curve_points(data, element, offset = offset)
+            with timed_stage("draw_element_curve " + element, names[j], rows = len(data)):
+                built = yield from draw_element_curve_steps(points, j,
+                                   gpname = str(j) + "_gpencil_" + element + "_" + names[j],
+                                   objname = str(j) + "_" + element + "_" + names[j],
+                                   matname = str(j) + "_material_" + names[j] + "_MANUAL",
+                                   emptyname = str(j) + "_" + element + "_position_" + names[j],
+                                   spherename = str(j) + "_" + element + "_body_" + names[j],
+                                   collection = collection, with_planet = make_planets)
+            tag_built(built, key, build)
+
+    return({"names": names, "stale": stale, "load": load, "draw": draw})
+
+#######################################################################
+#                 follow a running orbitN simulation                  #
+#######################################################################
+
+def new_follow_state():
+    """
+    Where we are in an output file that is still being written
+    """
+    return({"offset": 0, "partial": b"", "ncols": None, "rows": 0, "t0": None, "step": None})
+
+def read_appended(filename, state):
+    """
+    Parse the complete lines that were appended to filename since the last
+    call. Only the new bytes are read, state keeps the byte offset and the
+    last line while orbitN is still writing it.
+    """
+    with open(filename, 'rb') as f:
+        size = os.fstat(f.fileno()).st_size
+        if size < state["offset"]:
+            raise RuntimeError(f"{filename} got shorter, did orbitN start over?")
+        f.seek(state["offset"])
+        new = f.read(size - state["offset"])
+    # where the partial line, and so the block, starts in the file
+    start = state["offset"] - len(state["partial"])
+    state["offset"] += len(new)
+    buffer = state["partial"] + new
+    # hold on to the partial last line until its newline is written
+    end = buffer.rfind(b"\n") + 1
+    state["partial"] = buffer[end:]
+    block = buffer[:end]
+    if not block.strip():
+        return(np.empty((0, state["ncols"] or 0)))
+    if state["ncols"] is None:
+        state["ncols"] = len(block.split(b"\n", 1)[0].split())
+    return(parse_block(block, state["ncols"], offset = start))
+
+def follow_rows(rows, state, dt = 0):
+    """
+    The new rows that subset_data would keep with timesteps of dt (kyr),
+    counting from the start of the file
+    """
+    first = state["rows"]
+    state["rows"] += len(rows)
+    if dt == 0 or len(rows) == 0:
+        return(rows)
+    if state["step"] is None:
+        if first == 0:
+            state["t0"] = rows[0, 0]
+        if state["rows"] < 2:
+            # the first row is always kept, the step needs the second
+            return(rows)
+        years_per_row = abs(rows[1 - first, 0] - state["t0"]) / 365.25
+        state["step"] = max(1, int(dt*1e3 / years_per_row))
+    index = np.arange(first, first + len(rows))
+    return(rows[index % state["step"] == 0])
+
+def extend_buffer(collection, attr, values, width = 1, dtype = np.float32):
+    """
+    Set attr of the last len(values) items of a bpy collection that was just
+    grown, by reading the whole buffer, filling in the end and setting it
+    again in one call each
+    """
+    values = np.asarray(values, dtype = dtype).ravel()
+    buf = np.empty(len(collection) * width, dtype = dtype)
+    collection.foreach_get(attr, buf)
+    buf[len(buf) - len(values):] = values
+    collection.foreach_set(attr, buf)
+
+def extend_mesh(mesh, data):
+    """
+    Append rows of cartesian output to a mesh made by make_mesh, keeping the
+    vertices and attributes it has
+    """
+    start = len(mesh.vertices)
+    if len(data) == 0:
+        return(mesh)
+    mesh.vertices.add(len(data))
+    if start == 0:
+        return(fill_mesh(mesh, data))
+    data = np.asarray(data)
+    extend_buffer(mesh.vertices, "co", data[:, 1:4], width = 3)
+    for name, col in mesh_attributes.items():
+        extend_buffer(mesh.attributes[name].data, "value", data[:, col])
+    mesh.update()
+    return(mesh)
+
+def extend_location_keyframes(obj, locations, interpolation = None):
+    """
+    Append a keyframe for each row of xyz locations after the last keyframe of
+    the location F-curves made by bake_location_keyframes, with the same
+    (default) interpolation
+    """
+    locations = np.asarray(locations, dtype = np.float32).reshape(-1, 3)
+    action = obj.animation_data.action if obj.animation_data is not None else None
+    fcurve = action and action.fcurves.find("location", index = 0)
+    if fcurve is None or len(fcurve.keyframe_points) == 0:
+        return(bake_location_keyframes(obj, locations, interpolation = interpolation))
+    if len(locations) == 0:
+        return(action)
+    ipo = keyframe_interpolation(interpolation)
+    for axis in range(3):
+        fcurve = action.fcurves.find("location", index = axis)
+        points = fcurve.keyframe_points
+        start = len(points)
+        points.add(len(locations))
+        co = np.empty((len(locations), 2), dtype = np.float32)
+        co[:, 0] = np.arange(start + 1, start + 1 + len(locations))
+        co[:, 1] = locations[:, axis]
+        extend_buffer(points, "co", co, width = 2)
+        extend_buffer(points, "interpolation", np.full(len(locations), ipo), dtype = np.int32)
+        fcurve.update()
+    return(action)
+
+def extend_stroke(gp_stroke, points):
+    """
+    Append xyz points to a grease pencil stroke
+    """
+    if len(points) == 0:
+        return(gp_stroke)
+    gp_stroke.points.add(len(points))
+    extend_buffer(gp_stroke.points, "co", points, width = 3)
+    return(gp_stroke)
+
+def read_followed(body, dt = 0):
+    """
+    The rows written to the file of body since the last read, at timesteps of dt
+    """
+    if not os.path.exists(body["filename"]):
+        # orbitN hasn't written this one yet
+        return(np.empty((0, 7)))
+    return(follow_rows(read_appended(body["filename"], body["state"]), body["state"], dt))
+
+def update_followed(bodies, dt = 0):
+    """
+    Append the rows written since the previous update to the objects of each
+    body, returns the number of new rows
+    """
+    new = 0
+    for body in bodies:
+        rows = read_followed(body, dt)
+        if len(rows) == 0:
+            continue
+        start = len(body["mesh"].vertices)
+        extend_mesh(body["mesh"], rows)
+        if body["planet"] is not None:
+            extend_location_keyframes(body["planet"], rows[:, 1:4])
+        if body["stroke"] is not None:
+            points = element_curve_points(cartesian_to_kepler(rows, body["mu"]), "e")
+            points[:, 0] += start * 0.001
+            extend_stroke(body["stroke"], points)
+            if body["curve_planet"] is not None:
+                extend_location_keyframes(body["curve_planet"], points)
+        new += len(rows)
+    if new > 0:
+        bpy.context.scene.frame_end = max(len(body["mesh"].vertices) for body in bodies)
+    return(new)
+
+# experiments that are being followed, with their timer function
+followers = {}
+
+def follow_experiment(exp, dt = 0, make_planets = True, eccentricity = True, interval = 2.0):
+    """
+    Follow an orbitN simulation while it runs: draw the cartesian output that
+    is already there like make_meshes, then check the files every interval
+    seconds and append the new rows to the meshes, the planet keyframes and
+    the Earth's eccentricity curve (calculated from the cartesian output).
+    Call stop_following to stop.
+    """
+    stop_following(exp)
+    collection = make_collection(exp)
+    path, inputfile, outputs = get_files(exp, outext = ".dat")
+    names, masses, init_pos, init_velocity = get_inp(inputfile)
+    radii_au = get_planet_radii()
+    planet_mat = bpy.data.materials['Material']
+    planet_colors = get_planet_colors()
+    bodies = []
+    for j in range(0, 10):
+        body = {"filename": path + outputs[j], "state": new_follow_state(),
+                "planet": None, "stroke": None, "curve_planet": None}
+        # everything written so far is drawn in bulk, like make_meshes
+        rows = read_followed(body, dt = dt)
+        obj, body["mesh"] = make_mesh(rows, meshname = names[j], objname = str(j) + "_orbit_" + names[j],
+                                      color = planet_colors[j], material = planet_mat, collection = collection)
+        if make_planets:
+            body["planet"] = make_planet(position = rows[0, 1:4] if len(rows) > 0 else (0, 0, 0),
+                                         radius = 1e3 * radii_au[j],
+                                         emptyname = str(j) + "_body_position_" + names[j],
+                                         spherename = str(j) + "_body_sphere_" + names[j],
+                                         material = planet_mat,
+                                         color = planet_colors[j],
+                                         collection = collection)
+            bake_location_keyframes(body["planet"], rows[:, 1:4])
+        if eccentricity and j == 3: # just for the Earth
+            body["mu"] = planet_mu(masses[j])
+            points = element_curve_points(cartesian_to_kepler(rows, body["mu"]), "e")
+            gpo, gpd, gp_layer, gp_frame, body["stroke"] = make_gpencil(
+                points,
+                gpname = str(j) + "_gpencil_" + names[j],
+                objname = str(j) + "_eccentricity_curve_" + names[j],
+                matname = str(j) + "_material_" + names[j] + "_MANUAL",
+                collection = collection, type = "points", cyclic = False)
+            if make_planets:
+                body["curve_planet"] = make_planet(position = points[0] if len(points) > 0 else (0, 0, 0),
+                                                   radius = 1e3 * radii_au[j],
+                                                   emptyname = str(j) + "_eccentricity_" + names[j],
+                                                   spherename = str(j) + "_ecc_body_" + names[j],
+                                                   material = planet_mat,
+                                                   color = planet_colors[j],
+                                                   collection = collection)
+                bake_location_keyframes(body["curve_planet"], points)
+        bodies.append(body)
+    bpy.context.scene.frame_end = max([len(body["mesh"].vertices) for body in bodies] + [1])
+    def follow():
+        try:
+            new = update_followed(bodies, dt = dt)
+        except (ReferenceError, RuntimeError) as error:
+            # the objects were deleted or the output was truncated
+            print(f"stopped following {exp}: {error}")
+            followers.pop(exp, None)
+            return(None)
+        if new > 0:
+            print(f"{exp}: {new} new rows")
+        return(interval)
+    followers[exp] = follow
+    bpy.app.timers.register(follow, first_interval = interval)
+    return(bodies)
+
+def stop_following(exp = None):
+    """
+    Stop following exp, or all experiments
+    """
+    for name in [exp] if exp is not None else list(followers):
+        follow = followers.pop(name, None)
+        if follow is not None and bpy.app.timers.is_registered(follow):
+            bpy.app.timers.unregister(follow)
+
+#######################################################################
+#          import an experiment without blocking the interface        #
+#######################################################################
+
+# the plan for each builder of the import operator
+import_plans = {"meshes": plan_meshes, "animated_orbits": plan_animated_orbits, "trails": plan_trails,
+                "eccentricity_curve": plan_eccentricity_curve, "element_curves": plan_element_curves}
+
+# what the running import is doing, for the panel
+import_status = {"running": False, "cancel": False, "text": ""}
+
+def typed_float(value):
+    """
+    A FloatProperty (single precision) as it was typed, e.g. 0.8 in stead of
+    0.800000011920929, so a build hashes the same as the same call from a script
+    """
+    return(float(str(np.float32(value))))
+
+def redraw_panels(context):
+    for area in context.screen.areas if context.screen else []:
+        area.tag_redraw()
+
+if bpy is not None:
+    class ORBITN_OT_import_experiment(bpy.types.Operator):
+        """Load an orbitN experiment in the background and draw it planet by planet"""
+        bl_idname = "orbitn.import_experiment"
+        bl_label = "Import orbitN experiment"
+
+        exp: bpy.props.StringProperty(name = "Experiment", default = "solsys-keplerian")
+        builder: bpy.props.EnumProperty(name = "Draw", items = [
+            ("meshes", "Meshes", "Vertices for all positions, see make_meshes"),
+            ("animated_orbits", "Animated orbits", "An ellipse per frame, see make_animated_orbits"),
+            ("trails", "Trails", "Planets with a trail of their recent path, see make_trails"),
+            ("eccentricity_curve", "Eccentricity curve", "The Earth's eccentricity over time, "
+             "see make_eccentricity_curve"),
+            ("element_curves", "Element curves", "Orbital elements over time, see make_element_curves")])
+        tmax: bpy.props.FloatProperty(name = "tmax (kyr)", default = 405, min = 0,
+                                      description = "Time to draw, 0 for the whole run")
+        dt: bpy.props.FloatProperty(name = "dt (kyr)", default = 0.8, min = 0.001,
+                                    description = "Time between frames, less than a row draws every row")
+        outext: bpy.props.EnumProperty(name = "Orbits from", default = ".elm.dat", items = [
+            (".dat", "Cartesian (.dat)", ""), (".elm.dat", "Elements (.elm.dat)", "")])
+        make_planets: bpy.props.BoolProperty(name = "Planets", default = True)
+        animate_planets: bpy.props.BoolProperty(name = "Animate planets", default = True)
+        mode: bpy.props.EnumProperty(name = "Orbits", items = [
+            ("gpencil", "Grease pencil", ""), ("nodes", "Geometry nodes", "")])
+        N: bpy.props.IntProperty(name = "Points per orbit", default = int(360/5), min = 3)
+        trail_kyr: bpy.props.FloatProperty(name = "Trail (kyr)", default = 10, min = 0)
+        elements: bpy.props.StringProperty(name = "Elements", default = "e",
+                                           description = "Comma separated, of a, e, i, omega, Omega, varpi")
+        planets: bpy.props.StringProperty(name = "Planets", default = "3",
+                                          description = "Comma separated numbers, 0 Sun ... 9 Pluto")
+        spacing: bpy.props.FloatProperty(name = "Spacing", default = 0.5, min = 0)
+        workers: bpy.props.IntProperty(name = "Workers", default = 0, min = 0,
+                                       description = "Processes to load with, 0 for one per core")
+        incremental: bpy.props.BoolProperty(name = "Incremental", default = True)
+
+        # seconds of drawing per timer event, so the interface keeps responding
+        time_slice = 0.1
+
+        def invoke(self, context, event):
+            return(context.window_manager.invoke_props_dialog(self))
+
+        def execute(self, context):
+            if import_status["running"]:
+                self.report({'ERROR'}, "an orbitN import is already running")
+                return({'CANCELLED'})
+            # meshes and trails are drawn from the cartesian output
+            if self.builder == "meshes":
+                kwargs = dict(make_planets = self.make_planets, animate_planets = self.animate_planets)
+            elif self.builder == "trails":
+                kwargs = dict(make_planets = self.make_planets, trail_kyr = typed_float(self.trail_kyr))
+            elif self.builder == "eccentricity_curve":
+                kwargs = dict(outext = self.outext, make_planet = self.make_planets)
+            elif self.builder == "element_curves":
+                try:
+                    planets = tuple(int(j) for j in self.planets.split(","))
+                except ValueError:
+                    self.report({'ERROR'}, f"planets should be numbers separated by commas, not {self.planets!r}")
+                    return({'CANCELLED'})
+                elements = tuple(element.strip() for element in self.elements.split(","))
+                unknown = [element for element in elements if element not in element_columns]
+                if unknown:
+                    self.report({'ERROR'}, f"unknown elements {', '.join(unknown)}")
+                    return({'CANCELLED'})
+                kwargs = dict(outext = self.outext, elements = elements, planets = planets,
+                              make_planets = self.make_planets, spacing = typed_float(self.spacing))
+            else:
+                kwargs = dict(outext = self.outext, mode = self.mode, N = self.N)
+            self._plan = import_plans[self.builder](self.exp, tmax = typed_float(self.tmax) or math.inf,
+                                                    dt = typed_float(self.dt),
+                                                    workers = self.workers or None,
+                                                    incremental = self.incremental, **kwargs)
+            self._planets = None
+            self._error = None
+            self._done = 0
+            # the steps of the planet that is being drawn
+            self._steps = None
+            # load in a thread, the drawing has to happen in the main thread
+            self._thread = threading.Thread(target = self.load, daemon = True)
+            self._thread.start()
+            import_status.update(running = True, cancel = False, text = f"loading {self.exp}")
+            wm = context.window_manager
+            wm.progress_begin(0, len(self._plan["stale"]) + 1)
+            self._timer = wm.event_timer_add(0.05, window = context.window)
+            wm.modal_handler_add(self)
+            return({'RUNNING_MODAL'})
+
+        def load(self):
+            try:
+                self._planets = self._plan["load"]()
+            except Exception as error:
+                self._error = error
+
+        def modal(self, context, event):
+            if event.type == 'ESC':
+                import_status["cancel"] = True
+            if event.type != 'TIMER':
+                return({'PASS_THROUGH'})
+            stale = self._plan["stale"]
+            if self._thread.is_alive():
+                # the worker processes can't be interrupted, a cancel waits for them
+                self.progress(context, ("cancelling, waiting for " if import_status["cancel"] else "loading ")
+                              + self.exp)
+                return({'PASS_THROUGH'})
+            if self._error is not None:
+                self.finish(context)
+                self.report({'ERROR'}, f"could not load {self.exp}: {self._error}")
+                return({'CANCELLED'})
+            if import_status["cancel"]:
+                # this removes what was drawn of the current planet
+                self.finish(context)
+                self.report({'WARNING'}, f"cancelled {self.exp} after {self._done} of {len(stale)} planets")
+                return({'CANCELLED'})
+            # draw small steps until the time slice is used up, a planet can
+            # take several timer events
+            start = time.perf_counter()
+            while self._done < len(stale) and time.perf_counter() - start < self.time_slice:
+                j = stale[self._done]
+                if self._steps is None:
+                    self._steps = draw_planet(self._plan, self._planets[self._done], j)
+                try:
+                    next(self._steps)
+                except StopIteration:
+                    self._steps = None
+                    self._done += 1
+                    self.progress(context, f"drew {self._plan['names'][j]}, {self._done} of {len(stale)}")
+                except Exception as error:
+                    self._steps = None
+                    self.finish(context)
+                    self.report({'ERROR'}, f"could not draw {self._plan['names'][j]}: {error}")
+                    return({'CANCELLED'})
+            if self._done < len(stale):
+                if self._steps is not None:
+                    name = self._plan["names"][stale[self._done]]
+                    self.progress(context, f"drawing {name}, {self._done} of {len(stale)}")
+                return({'PASS_THROUGH'})
+            self.finish(context)
+            self.report({'INFO'}, f"drew {len(stale)} planets of {self.exp}")
+            return({'FINISHED'})
+
+        def progress(self, context, text):
+            import_status["text"] = text
+            context.window_manager.progress_update(self._done + (self._planets is not None))
+            context.workspace.status_text_set(f"orbitN: {text} (Esc to cancel)")
+            redraw_panels(context)
+
+        def finish(self, context):
+            wm = context.window_manager
+            wm.event_timer_remove(self._timer)
+            wm.progress_end()
+            context.workspace.status_text_set(None)
+            if self._steps is not None:
+                self._steps.close()
+                self._steps = None
+            if self._planets is not None:
+                release_shared(self._planets)
+                self._planets = None
+            import_status.update(running = False, cancel = False, text = "")
+            redraw_panels(context)
+
+    class ORBITN_OT_cancel_import(bpy.types.Operator):
+        """Stop the running orbitN import, dropping the planet that is being drawn"""
+        bl_idname = "orbitn.cancel_import"
+        bl_label = "Cancel orbitN import"
+
+        def execute(self, context):
+            import_status["cancel"] = True
+            return({'FINISHED'})
+
+    class ORBITN_PT_import(bpy.types.Panel):
+        bl_label = "orbitN"
+        bl_space_type = 'VIEW_3D'
+        bl_region_type = 'UI'
+        bl_category = "orbitN"
+
+        def draw(self, context):
+            layout = self.layout
+            if import_status["running"]:
+                layout.label(text = import_status["text"])
+                layout.operator("orbitn.cancel_import", icon = 'CANCEL')
+            else:
+                layout.operator("orbitn.import_experiment", icon = 'IMPORT')
+
+    import_classes = (ORBITN_OT_import_experiment, ORBITN_OT_cancel_import, ORBITN_PT_import)
+
+def register():
+    """
+    Add the import operator and its panel (3D viewport sidebar, orbitN tab)
+    """
+    for cls in import_classes:
+        # replace the classes of an earlier run of this script
+        old = getattr(bpy.types, cls.__name__, None)
+        if old is not None:
+            bpy.utils.unregister_class(old)
+        bpy.utils.register_class(cls)
+
+def unregister():
+    for cls in reversed(import_classes):
+        bpy.utils.unregister_class(cls)
 
 #######################################################################
 #                           draw modern runs                          #
@@ -479,11 +2797,30 @@ def make_eccentricity_curve(exp, tmax = 405, dt = 0.8, outext = ".elm.dat", make
 #make_animated_orbits(exp = "solsys-keplerian", tmax = .4, dt = 0.4, outext = ".elm.dat")
 #make_animated_orbits(exp = "solsys-keplerian", tmax = 405, dt = 0.8, outext = ".elm.dat")
 #make_animated_orbits(exp = "solsys-keplerian", tmax = 2.4e3, dt = 0.8, outext = ".elm.dat")
+# the same, but only store the elements and let geometry nodes draw the ellipse
+#make_animated_orbits(exp = "solsys-keplerian", tmax = 60e3, dt = 0.8, outext = ".elm.dat", mode = "nodes")
 
 # draw an eccentricity curve vs time (1 frame * 0.001 on x, 0 on y, eccentricity * 10 on z
 #make_eccentricity_curve(exp = "solsys-keplerian", tmax = 405, dt = .8, outext = ".elm.dat", make_planet = True)
 #make_eccentricity_curve(exp = "solsys-keplerian", tmax = 2.4e3, dt = .8, outext = ".elm.dat", make_planet = True)
 
+# draw the eccentricity and inclination of the inner planets
+#make_element_curves(exp = "solsys-keplerian", elements = ("e", "i"), planets = (1, 2, 3, 4),
+#                    tmax = 405, dt = .8, outext = ".elm.dat", make_planets = True)
+
+# the full 60 Myr point clouds in bins of 100 kyr, only keeping 400 kyr loaded
+#make_binned_meshes(exp = "solsys-keplerian", bin_kyr = 100, window_kyr = 400, dt = .4, unload = True)
+
+# add the import operator, which loads in the background and can be cancelled
+# with Esc, to the orbitN tab of the 3D viewport sidebar
+#register()
+
+# planets with a trail of their last 10 kyr, one row per frame
+#make_trails(exp = "solsys-keplerian", trail_kyr = 10, tmax = 405, dt = .4, make_planets = True)
+
+# watch a simulation while orbitN is still running, stop_following() to stop
+#follow_experiment(exp = "solsys-keplerian", dt = .8, make_planets = True, eccentricity = True)
+
 
 ### create a text object that says the current timestep
 ### NOTE: I did this using geometry nodes in stead, based on the timestep in the output of 400 days per step